@@ -0,0 +1,503 @@
+import types
+
+import numpy as np
+
+from constants import *
+from mazedata import MazeData, MazeFiles
+from modes import MainMode, ModeController
+from nodes import NodeGroup, accessMask
+from paths import PathTable
+from pellets import PelletGroup
+
+# 方向編號 (NodeGraph.COMPASS 的順序，4 = STOP)，actions 也用這個編號
+DIRECTIONS = (UP, DOWN, LEFT, RIGHT, STOP)
+UPINDEX, DOWNINDEX, LEFTINDEX, RIGHTINDEX, STOPINDEX = range(5)
+PORTALINDEX = 4 # NodeGraph.neighbors 的傳送門欄位
+VECTORS = np.array([(0, -1), (0, 1), (-1, 0), (1, 0), (0, 0)], dtype=float)
+OPPOSITE = np.array([DOWNINDEX, UPINDEX, RIGHTINDEX, LEFTINDEX, STOPINDEX], dtype=np.int8)
+
+# 實體編號：0 = Pacman，1-4 = 鬼魂 (鬼魂陣列用 0-3)
+NAMES = (PACMAN, BLINKY, PINKY, INKY, CLYDE)
+BITS = [accessMask((name,)) for name in NAMES]
+SCATTERGOALS = np.array([(0, 0), (TILEWIDTH*NCOLS, 0),
+                         (TILEWIDTH*NCOLS, TILEHEIGHT*NROWS), (0, TILEHEIGHT*NROWS)], dtype=float)
+
+
+def actionIndex(direction) -> int:
+    """Map UP/DOWN/LEFT/RIGHT/STOP to the action numbers step() takes."""
+    return DIRECTIONS.index(direction)
+
+
+class BatchGames:
+    """n games of one maze stepped together on NumPy arrays, for bot training.
+
+    Every game is a row of the same struct-of-arrays state (node and target
+    indices, distance travelled along that edge, directions, mode timers,
+    pellet bitmaps, score, lives) and step() advances all rows one fixed tick with the rules of
+    Entity, Pacman, Ghost, ModeController and Simulation. Differences from
+    Simulation: no pauses (a death or a cleared level resets at once),
+    every level replays this maze, abilities are not modelled and games
+    that end are restarted in place.
+    """
+
+    def __init__(self, n, level=0, seed=None) -> None:
+        self.n = n
+        self.dt = TICKLENGTH * TIMESCALE
+        self.rng = np.random.default_rng(seed)
+        self.rows = np.arange(n)
+        self.buildMaze(level)
+
+        p = len(self.pelletPositions)
+        self.position = np.zeros((n, 5, 2)) # 由 node、target 與 travelled 推出，和 Entity.position 相同
+        self.travelled = np.zeros((n, 5))
+        self.node = np.zeros((n, 5), dtype=np.int32)
+        self.target = np.zeros((n, 5), dtype=np.int32)
+        self.direction = np.zeros((n, 5), dtype=np.int8)
+        self.speed = np.zeros((n, 5))
+        self.goal = np.zeros((n, 4, 2))
+        self.ghostMode = np.zeros((n, 4), dtype=np.int8)
+        self.freightTimer = np.zeros((n, 4))
+        self.randomWalk = np.zeros((n, 4), dtype=bool) # directionMethod 是 randomDirection
+        self.access = np.zeros((n, len(self.positions), 4), dtype=np.int32) # 每局的 NodeGraph.access
+        self.ghostPoints = np.zeros(n, dtype=np.int64)
+        self.mainMode = np.zeros(n, dtype=np.int8)
+        self.mainTimer = np.zeros(n)
+        self.mainTime = np.zeros(n)
+        self.pellets = np.zeros((n, p), dtype=bool)
+        self.numEaten = np.zeros(n, dtype=np.int32)
+        self.flashTimer = np.zeros(n)
+        self.powerVisible = np.zeros(n, dtype=bool)
+        self.invisible = np.zeros(n, dtype=bool)
+        self.invisibleTimer = np.zeros(n)
+        self.boosted = np.zeros(n, dtype=bool)
+        self.boostTimer = np.zeros(n)
+        self.fruitActive = np.zeros(n, dtype=bool)
+        self.fruitTimer = np.zeros(n)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.lives = np.zeros(n, dtype=np.int32)
+        self.level = np.zeros(n, dtype=np.int32)
+        self.extraLife = np.zeros(n, dtype=bool)
+        self.reset(self.rows)
+
+    def buildMaze(self, level) -> None:
+        """Set the maze up the way Simulation.startGame does and keep it as arrays."""
+        mazedata = MazeData()
+        mazedata.loadMaze(level)
+        maze = mazedata.obj
+        nodes = NodeGroup(maze.name+".txt")
+        maze.setPortalPairs(nodes)
+        maze.connectHomeNodes(nodes)
+        actors = [types.SimpleNamespace(name=name) for name in NAMES] # 只需要 name 的替身
+        pacman, blinky, pinky, inky, clyde = actors
+        ghosts = actors[1:]
+        nodes.denyHomeAccess(pacman)
+        nodes.denyHomeAccessList(ghosts)
+        inkyStart = nodes.getNodeFromTiles(*maze.addOffset(0, 3))
+        clydeStart = nodes.getNodeFromTiles(*maze.addOffset(4, 3))
+        inkyStart.denyAccess(RIGHT, inky)
+        clydeStart.denyAccess(LEFT, clyde)
+        maze.denyGhostsAccess(ghosts, nodes)
+
+        graph = self.graph = nodes.graph
+        self.positions = graph.positionTable()
+        self.neighbors = graph.neighborTable()
+        self.startAccess = np.array(graph.access, dtype=np.int32)
+        self.startNodes = np.array([graph.nodeAt(*maze.pacmanStart),
+                                    graph.nodeAt(*maze.addOffset(2, 0)),
+                                    graph.nodeAt(*maze.addOffset(2, 3)),
+                                    inkyStart.id, clydeStart.id], dtype=np.int32)
+        self.pacmanTarget = self.neighbors[self.startNodes[0], LEFTINDEX]
+        self.pacmanStart = (self.positions[self.startNodes[0]] + self.positions[self.pacmanTarget]) / 2.0
+        self.pacmanHalfway = graph.edge(self.startNodes[0], self.pacmanTarget)[0] / 2.0
+        self.spawnNode = graph.nodeAt(*maze.addOffset(2, 3))
+        self.homeNode = nodes.nodesLUT[nodes.homekey].id
+        self.cornerNode = 0 # getStartTempNode()，也就是 Ghost.homeNode
+        self.inkyStart = inkyStart.id
+        self.clydeStart = clydeStart.id
+        self.buildRoutes()
+        homes = set(nodes.getHomeNodes())
+        self.teleportNodes = np.array([node.id for key, node in nodes.nodesLUT.items()
+                                       if key not in homes], dtype=np.int32)
+        fruitNode = graph.nodeAt(9, 20)
+        self.fruitPosition = (self.positions[fruitNode] + self.positions[self.neighbors[fruitNode, RIGHTINDEX]]) / 2.0
+
+        pelletList = PelletGroup(maze.name+".txt").pelletList
+        self.pelletPositions = np.array([pellet.position.asTuple() for pellet in pelletList], dtype=float)
+        self.pelletKinds = np.array([pellet.name for pellet in pelletList], dtype=np.int32)
+        self.pelletPoints = np.array([pellet.points for pellet in pelletList], dtype=np.int64)
+        compiled = MazeFiles.compiled(maze.name+".txt")
+        self.pelletGrid = np.full((compiled.rows, compiled.cols), -1, dtype=np.int32) # 每格的豆子編號
+        for i, (x, y) in enumerate(self.pelletPositions):
+            self.pelletGrid[int(y) // TILEHEIGHT, int(x) // TILEWIDTH] = i
+
+    def buildRoutes(self) -> None:
+        """Path lengths for every ghost under every access state its game can reach.
+
+        Only a few masks change during play (the home door, the corner the
+        ghost leaves the house by, Inky's and Clyde's release), so routeDist[g, s]
+        is the PathTable for ghost g with switch k open when bit k of s is set.
+        """
+        graph = self.graph
+        self.switches = [(self.homeNode, DOWNINDEX), (self.cornerNode, DOWNINDEX),
+                         (self.inkyStart, RIGHTINDEX), (self.clydeStart, LEFTINDEX)]
+        self.lengths = np.sqrt(graph.lengthTable()[:, :4])
+        saved = graph.saveAccess()
+        self.routeDist = np.zeros((4, 1 << len(self.switches)) + (len(self.positions),) * 2, dtype=np.float32)
+        for g in range(4):
+            bit = BITS[g+1]
+            for state in range(1 << len(self.switches)):
+                for k, (node, slot) in enumerate(self.switches):
+                    mask = saved[node][slot]
+                    graph.setAccess(node, slot, mask | bit if state >> k & 1 else mask & ~bit)
+                self.routeDist[g, state] = PathTable(graph, NAMES[g+1]).table
+        graph.restoreAccess(saved)
+
+    def routeState(self, e, rows):
+        state = np.zeros(len(rows), dtype=np.int64)
+        for k, (node, slot) in enumerate(self.switches):
+            state |= (self.access[rows, node, slot] & BITS[e] != 0).astype(np.int64) << k
+        return state
+
+    def reset(self, rows) -> None:
+        """Start new games in the given rows."""
+        self.score[rows] = 0
+        self.lives[rows] = 5
+        self.level[rows] = 0
+        self.extraLife[rows] = False
+        self.startLevel(rows)
+
+    def startLevel(self, rows) -> None:
+        self.pellets[rows] = True
+        self.numEaten[rows] = 0
+        self.flashTimer[rows] = 0
+        self.powerVisible[rows] = True
+        self.mainMode[rows] = SCATTER
+        self.mainTimer[rows] = 0
+        self.mainTime[rows] = MainMode.scatterTime
+        self.ghostMode[rows] = SCATTER
+        self.freightTimer[rows] = 0
+        self.goal[rows] = 0
+        self.access[rows] = self.startAccess
+        self.resetEntities(rows)
+
+    def resetEntities(self, rows) -> None:
+        """Pacman.reset, GhostGroup.reset and no fruit, as after a death."""
+        self.node[rows] = self.startNodes
+        self.target[rows] = self.startNodes
+        self.target[rows, 0] = self.pacmanTarget
+        self.position[rows] = self.positions[self.startNodes]
+        self.position[rows, 0] = self.pacmanStart
+        self.travelled[rows] = 0
+        self.travelled[rows, 0] = self.pacmanHalfway
+        self.direction[rows] = STOPINDEX
+        self.direction[rows, 0] = LEFTINDEX
+        self.speed[rows] = 100
+        self.invisible[rows] = False
+        self.invisibleTimer[rows] = 0
+        self.boosted[rows] = False
+        self.boostTimer[rows] = 0
+        self.randomWalk[rows] = False
+        self.ghostPoints[rows] = 200
+        self.fruitActive[rows] = False
+
+    def step(self, actions):
+        """Advance every game one tick; actions holds one direction number per game.
+
+        Returns (rewards, dones): the points scored this tick and whether the
+        game ended (those rows have already been restarted).
+        """
+        actions = np.asarray(actions, dtype=np.int8)
+        dt = self.dt
+        before = self.score.copy()
+
+        self.flashTimer += dt
+        flash = self.flashTimer >= 0.2
+        self.powerVisible[flash] = ~self.powerVisible[flash]
+        self.flashTimer[flash] = 0
+
+        self.updateMainMode(dt)
+        for g in range(4):
+            self.updateGhost(g, dt)
+        self.fruitTimer[self.fruitActive] += dt
+
+        cleared = self.checkPelletEvents()
+        playing = ~cleared
+        died = self.checkGhostEvents(playing)
+        self.checkFruitEvents(playing)
+        self.updatePacman(np.nonzero(playing & ~died)[0], actions, dt)
+
+        rewards = self.score - before
+        over = died & (self.lives <= 0)
+        self.resetEntities(np.nonzero(died & ~over)[0])
+        clearedRows = np.nonzero(cleared)[0]
+        self.level[clearedRows] += 1
+        self.startLevel(clearedRows)
+        self.reset(np.nonzero(over)[0])
+        return rewards, over
+
+    def addScore(self, rows, points) -> None:
+        self.score[rows] += points
+        award = rows[~self.extraLife[rows] & (self.score[rows] >= 10000)]
+        self.lives[award] += 1
+        self.extraLife[award] = True
+
+    def updateMainMode(self, dt) -> None:
+        self.mainTimer += dt
+        switch = self.mainTimer >= self.mainTime
+        chase = switch & (self.mainMode == SCATTER)
+        scatter = switch & (self.mainMode == CHASE)
+        self.mainMode[chase] = CHASE
+        self.mainTime[chase] = MainMode.chaseTime
+        self.mainMode[scatter] = SCATTER
+        self.mainTime[scatter] = MainMode.scatterTime
+        self.mainTimer[switch] = 0
+
+    def normalMode(self, rows, g) -> None:
+        self.speed[rows, g+1] = 100
+        self.randomWalk[rows, g] = False
+        self.access[rows, self.cornerNode, DOWNINDEX] &= ~BITS[g+1]
+        self.ghostMode[rows, g] = self.mainMode[rows]
+
+    def updateGhost(self, g, dt) -> None:
+        """Ghost.update for ghost g of every game: modes, goal, then Entity.update."""
+        mode = self.ghostMode[:, g]
+        normal = (mode == SCATTER) | (mode == CHASE)
+        mode[normal] = self.mainMode[normal]
+        freight = np.nonzero(mode == FREIGHT)[0]
+        if freight.size:
+            self.freightTimer[freight, g] += dt
+            self.normalMode(freight[self.freightTimer[freight, g] >= ModeController.freightTime], g)
+        home = np.nonzero((mode == SPAWN) & (self.node[:, g+1] == self.spawnNode))[0]
+        self.normalMode(home, g)
+
+        scatter = mode == SCATTER
+        self.goal[scatter, g] = SCATTERGOALS[g]
+        chase = np.nonzero(mode == CHASE)[0]
+        if chase.size:
+            pacman = self.position[chase, 0]
+            ahead = VECTORS[self.direction[chase, 0]]
+            if g == 0:
+                goal = pacman
+            elif g == 1:
+                goal = pacman + ahead * TILEWIDTH * 4
+            elif g == 2:
+                blinky = self.position[chase, 1]
+                goal = blinky + (pacman + ahead * TILEWIDTH * 2 - blinky) * 2
+            else:
+                d = pacman - self.position[chase, 4]
+                near = (d[:, 0]**2 + d[:, 1]**2) <= (TILEWIDTH * 8)**2
+                goal = np.where(near[:, None], SCATTERGOALS[3], pacman + ahead * TILEWIDTH * 4)
+            self.goal[chase, g] = goal
+        self.move(g+1, self.rows, dt)
+
+    def edges(self, e, rows):
+        """Start position, unit vector and pixel length of the edges entity e is on (NodeGraph.edge)."""
+        start = self.positions[self.node[rows, e]]
+        vec = self.positions[self.target[rows, e]] - start
+        length = np.sqrt(vec[:, 0]**2 + vec[:, 1]**2)
+        unit = np.divide(vec, length[:, None], out=np.zeros_like(vec), where=length[:, None] > 0)
+        return start, unit, length
+
+    def move(self, e, rows, dt):
+        """Step entity e of the given games along its edge; return the rows that reached the target."""
+        self.travelled[rows, e] += np.where(self.direction[rows, e] != STOPINDEX, self.speed[rows, e] * dt, 0.0)
+        start, unit, length = self.edges(e, rows)
+        self.position[rows, e] = start + unit * self.travelled[rows, e, None]
+        arrived = rows[self.travelled[rows, e] >= length]
+        if e > 0 and arrived.size:
+            self.ghostArrive(e-1, arrived)
+        return arrived
+
+    def validMoves(self, e, rows, nodes):
+        """validDirection for UP/DOWN/LEFT/RIGHT at nodes of the given games."""
+        return (self.access[rows, nodes] & BITS[e] != 0) & (self.neighbors[nodes, :4] >= 0)
+
+    def newTarget(self, e, rows, nodes, directions):
+        """getNewTarget: the neighbour in direction when it is valid, else the node itself."""
+        valid = self.validMoves(e, rows, nodes)
+        column = np.minimum(directions, RIGHTINDEX)
+        ok = (directions != STOPINDEX) & valid[np.arange(len(rows)), column]
+        return np.where(ok, self.neighbors[nodes, column], nodes)
+
+    def ghostArrive(self, g, rows) -> None:
+        e = g + 1
+        node = self.target[rows, e]
+        direction = self.direction[rows, e]
+        valid = self.validMoves(e, rows, node)
+        valid &= np.arange(4) != OPPOSITE[direction][:, None]
+        count = valid.sum(1)
+        choice = OPPOSITE[direction] # validDirections 沒有選擇時只能回頭
+        walk = self.randomWalk[rows, g]
+        seek = np.nonzero(~walk & (count > 0))[0]
+        if seek.size:
+            vec = self.positions[node[seek], None] + VECTORS[:4] * TILEWIDTH - self.goal[rows[seek], g, None]
+            distances = vec[:, :, 0]**2 + vec[:, :, 1]**2
+            distances[~valid[seek]] = np.inf
+            choice[seek] = np.argmin(distances, axis=1)
+            # Ghost.goalNode：回家的眼睛和 Blinky 追擊時的目標是節點，改走最短路
+            mode = self.ghostMode[rows[seek], g]
+            goalNode = np.where(mode == SPAWN, self.spawnNode,
+                                np.where((mode == CHASE) & (g == 0), self.target[rows[seek], 0], -1))
+            routed = np.nonzero((goalNode >= 0) & (goalNode != node[seek]))[0]
+            if routed.size:
+                r = seek[routed]
+                table = self.routeDist[g, self.routeState(e, rows[r])]
+                lengths = self.lengths[node[r]] + table[np.arange(r.size)[:, None],
+                                                        self.neighbors[node[r], :4], goalNode[routed, None]]
+                lengths[~valid[r]] = np.inf
+                found = ~np.isinf(lengths.min(axis=1))
+                choice[r[found]] = np.argmin(lengths[found], axis=1)
+        wander = np.nonzero(walk & (count > 0))[0]
+        if wander.size:
+            pick = (self.rng.random(wander.size) * count[wander]).astype(np.int64)
+            choice[wander] = np.argmax(np.cumsum(valid[wander], axis=1) > pick[:, None], axis=1)
+        portal = self.neighbors[node, PORTALINDEX]
+        node = np.where(portal >= 0, portal, node)
+        target = self.newTarget(e, rows, node, choice)
+        moved = target != node
+        direction = np.where(moved, choice, direction)
+        self.target[rows, e] = np.where(moved, target, self.newTarget(e, rows, node, direction))
+        self.direction[rows, e] = direction
+        self.node[rows, e] = node
+        self.travelled[rows, e] = 0
+        self.position[rows, e] = self.positions[node]
+
+    def checkPelletEvents(self):
+        """Eat the pellet under each Pacman; return the games whose maze is now empty."""
+        pacman = self.position[:, 0]
+        rows, cols = self.pelletGrid.shape
+        col = np.clip(np.rint(pacman[:, 0] / TILEWIDTH).astype(np.int64), 0, cols-1)
+        row = np.clip(np.rint(pacman[:, 1] / TILEHEIGHT).astype(np.int64), 0, rows-1)
+        pellet = self.pelletGrid[row, col]
+        d = pacman - self.pelletPositions[pellet]
+        hit = (pellet >= 0) & self.pellets[self.rows, pellet] & ((d[:, 0]**2 + d[:, 1]**2) <= (5 + 2)**2)
+        rows = np.nonzero(hit)[0]
+        cleared = np.zeros(self.n, dtype=bool)
+        if not rows.size:
+            return cleared
+        pellet = pellet[rows]
+        kind = self.pelletKinds[pellet]
+        self.numEaten[rows] += 1
+        self.addScore(rows, self.pelletPoints[pellet])
+
+        teleport = rows[kind == TELEPORTPELLET]
+        if teleport.size:
+            nodes = self.rng.choice(self.teleportNodes, teleport.size)
+            self.node[teleport, 0] = nodes
+            self.target[teleport, 0] = nodes
+            self.travelled[teleport, 0] = 0
+            self.position[teleport, 0] = self.positions[nodes]
+        power = rows[kind == POWERPELLET]
+        if power.size:
+            self.startFreight(power)
+        invisible = rows[kind == INVISIBILITYPELLET]
+        self.invisible[invisible] = True
+        self.invisibleTimer[invisible] = 5.0
+        boost = rows[kind == SPEEDBOOSTPELLET]
+        self.boosted[boost] = True
+        self.boostTimer[boost] = 8.0
+        self.speed[boost, 0] = 100 * 1.5
+        for r, own in zip(rows[kind == SCOREMAGNETPELLET], pellet[kind == SCOREMAGNETPELLET]):
+            self.magnet(r, own)
+
+        self.access[rows[self.numEaten[rows] == 30], self.inkyStart, RIGHTINDEX] |= BITS[3]
+        self.access[rows[self.numEaten[rows] == 70], self.clydeStart, LEFTINDEX] |= BITS[4]
+        self.pellets[rows, pellet] = False
+        cleared[rows] = ~self.pellets[rows].any(axis=1)
+        return cleared
+
+    def magnet(self, r, own) -> None:
+        """Absorb the visible pellets and power pellets within 4 tiles of Pacman in game r."""
+        d = self.pelletPositions - self.position[r, 0]
+        kinds = self.pelletKinds
+        absorb = self.pellets[r] & ((kinds == PELLET) | ((kinds == POWERPELLET) & self.powerVisible[r]))
+        absorb &= (d[:, 0]**2 + d[:, 1]**2) <= (TILEWIDTH * 4)**2
+        absorb[own] = False
+        self.addScore(np.array([r]), self.pelletPoints[absorb].sum())
+        self.numEaten[r] += absorb.sum()
+        self.pellets[r, absorb] = False
+
+    def startFreight(self, rows) -> None:
+        """GhostGroup.startFreight for the given games."""
+        mode = self.ghostMode[rows]
+        self.freightTimer[rows] = np.where(mode <= FREIGHT, 0, self.freightTimer[rows])
+        mode[mode <= CHASE] = FREIGHT
+        self.ghostMode[rows] = mode
+        freight = mode == FREIGHT
+        self.speed[rows, 1:] = np.where(freight, 50, self.speed[rows, 1:])
+        self.randomWalk[rows] |= freight
+        self.ghostPoints[rows] = 200
+
+    def checkGhostEvents(self, playing):
+        """Pacman against each ghost; return the games where Pacman died."""
+        died = np.zeros(self.n, dtype=bool)
+        touching = playing & ~self.invisible
+        if not touching.any():
+            return died
+        pacman = self.position[:, 0]
+        for g in range(4):
+            d = pacman - self.position[:, g+1]
+            hit = touching & ((d[:, 0]**2 + d[:, 1]**2) <= (5 + 5)**2)
+            mode = self.ghostMode[:, g]
+            eaten = np.nonzero(hit & (mode == FREIGHT))[0]
+            if eaten.size:
+                self.addScore(eaten, self.ghostPoints[eaten])
+                self.ghostPoints[eaten] *= 2
+                self.ghostMode[eaten, g] = SPAWN
+                self.speed[eaten, g+1] = 150
+                self.randomWalk[eaten, g] = False
+                self.goal[eaten, g] = self.positions[self.spawnNode]
+                self.access[eaten, self.homeNode, DOWNINDEX] |= BITS[g+1]
+            caught = np.nonzero(hit & (mode != FREIGHT) & (mode != SPAWN) & ~died)[0]
+            self.lives[caught] -= 1
+            died[caught] = True
+        return died
+
+    def checkFruitEvents(self, playing) -> None:
+        appear = playing & ~self.fruitActive & ((self.numEaten == 50) | (self.numEaten == 140))
+        self.fruitActive[appear] = True
+        self.fruitTimer[appear] = 0
+        d = self.position[:, 0] - self.fruitPosition
+        eaten = np.nonzero(playing & self.fruitActive & ((d[:, 0]**2 + d[:, 1]**2) <= (5 + 5)**2))[0]
+        self.addScore(eaten, 100 + self.level[eaten] * 20)
+        self.fruitActive[eaten] = False
+        self.fruitActive[playing & (self.fruitTimer >= 5)] = False
+
+    def updatePacman(self, rows, actions, dt) -> None:
+        """Pacman.update for the given games."""
+        invisible = rows[self.invisible[rows]]
+        self.invisibleTimer[invisible] -= dt
+        ended = invisible[self.invisibleTimer[invisible] <= 0]
+        self.invisible[ended] = False
+        self.invisibleTimer[ended] = 0
+
+        arrived = self.move(0, rows, dt)
+        if arrived.size:
+            node = self.target[arrived, 0]
+            portal = self.neighbors[node, PORTALINDEX]
+            node = np.where(portal >= 0, portal, node)
+            wanted = actions[arrived]
+            target = self.newTarget(0, arrived, node, wanted)
+            moved = target != node
+            direction = np.where(moved, wanted, self.direction[arrived, 0])
+            target = np.where(moved, target, self.newTarget(0, arrived, node, direction))
+            self.direction[arrived, 0] = np.where(target == node, STOPINDEX, direction)
+            self.target[arrived, 0] = target
+            self.node[arrived, 0] = node
+            self.travelled[arrived, 0] = 0
+            self.position[arrived, 0] = self.positions[node]
+        travelling = np.ones(self.n, dtype=bool)
+        travelling[arrived] = False
+        back = rows[travelling[rows] & (actions[rows] != STOPINDEX) & (actions[rows] == OPPOSITE[self.direction[rows, 0]])]
+        self.direction[back, 0] = OPPOSITE[self.direction[back, 0]]
+        self.node[back, 0], self.target[back, 0] = self.target[back, 0], self.node[back, 0]
+        start, unit, length = self.edges(0, back)
+        self.travelled[back, 0] = length - self.travelled[back, 0]
+        self.position[back, 0] = start + unit * self.travelled[back, 0, None]
+
+        boosted = rows[self.boosted[rows]]
+        self.boostTimer[boosted] -= dt
+        ended = boosted[self.boostTimer[boosted] <= 0]
+        self.boosted[ended] = False
+        self.speed[ended, 0] = 100
+        self.boostTimer[ended] = 0
@@ -0,0 +1,540 @@
+"""Microbenchmarks for the per-frame hot paths.
+
+Run with ``python benchmark.py [name ...]``; no window is opened, the SDL
+dummy video driver is used so the benchmarks also run on headless machines.
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from constants import *
+from nodes import PORTALSLOT, SLOTS
+
+
+def setupDisplay() -> None:
+    pygame.init()
+    pygame.display.set_mode(SCREENSIZE, 0, 32)
+
+
+def countNewSurfaces(images, known) -> int:
+    """Count the Surfaces in images that were never seen before (references are kept alive)."""
+    count = 0
+    for image in images:
+        if id(image) not in known:
+            known[id(image)] = image
+            count += 1
+    return count
+
+
+def benchSpriteUpdate(frames=3000) -> None:
+    """Per-frame sprite update cost: slicing the sheet every tick vs the prebuilt frame tables."""
+    from ghosts import GhostGroup
+    from nodes import NodeGroup
+    from pacman import Pacman
+    from sprites import SpriteAtlas
+
+    nodes = NodeGroup("maze1.txt")
+    pacman = Pacman(nodes.getNodeFromTiles(15, 26))
+    ghosts = GhostGroup(nodes.getStartTempNode(), pacman)
+    entities = [pacman, *ghosts]
+    directions = [LEFT, UP, RIGHT, DOWN]
+    dt = 1 / 30
+
+    # The previous implementation: one set_clip + subsurface per entity per frame.
+    sheet = SpriteAtlas.getSheet()
+    def sliceImage(x, y):
+        sheet.set_clip(pygame.Rect(x*TILEWIDTH, y*TILEHEIGHT, 2*TILEWIDTH, 2*TILEHEIGHT))
+        return sheet.subsurface(sheet.get_clip())
+
+    known = {}
+    allocated = 0
+    start = time.perf_counter()
+    for i in range(frames):
+        for entity in entities:
+            entity.image = sliceImage(i % 10, 2 * (i % 4))
+        allocated += countNewSurfaces([entity.image for entity in entities], known)
+    sliced = time.perf_counter() - start
+    print(f"sliced per frame : {sliced / frames * 1e6:8.2f} us/frame, "
+          f"{allocated / frames:.2f} new Surfaces/frame")
+
+    for entity in entities:
+        entity.sprites.update(dt)
+    known = {}
+    countNewSurfaces([image for table in pacman.sprites.frames.values() for image in table], known)
+    for ghost in ghosts:
+        for table in ghost.sprites.frames.values():
+            countNewSurfaces(table.values(), known)
+    allocated = 0
+    start = time.perf_counter()
+    for i in range(frames):
+        direction = directions[(i // 15) % 4]
+        for entity in entities:
+            entity.direction = direction
+            entity.sprites.update(dt)
+        allocated += countNewSurfaces([entity.image for entity in entities], known)
+    tables = time.perf_counter() - start
+    print(f"frame tables     : {tables / frames * 1e6:8.2f} us/frame, "
+          f"{allocated / frames:.2f} new Surfaces/frame")
+
+
+def benchSimulation(ticks=30000) -> None:
+    """Headless game ticks per second for each character, steered by a random bot."""
+    from controls import RandomControl
+    from simulation import Simulation
+
+    for character in (0, 1, 2):
+        sim = Simulation(character, RandomControl(seed=1), headless=True, seed=1)
+        sim.startGame()
+        sim.pause.setPause(should_be_paused=False)
+        start = time.perf_counter()
+        for i in range(ticks):
+            if i % 20 == 0:
+                sim.useAbility()
+            sim.step(1 / 30 * 0.8)
+            sim.popEvents()
+        elapsed = time.perf_counter() - start
+        print(f"character {character}      : {ticks / elapsed:8.0f} ticks/s, score {sim.score}")
+
+
+def benchBatch(ticks=1500) -> None:
+    """Environment steps per second of BatchGames (one step = one game advanced one tick)."""
+    import numpy as np
+
+    from batch import BatchGames
+
+    rng = np.random.default_rng(1)
+    for n in (1, 256, 4096):
+        games = BatchGames(n, seed=1)
+        start = time.perf_counter()
+        for i in range(ticks):
+            if i % 15 == 0:
+                actions = rng.integers(0, 5, n)
+            games.step(actions)
+        elapsed = time.perf_counter() - start
+        print(f"{n:5d} games       : {n * ticks / elapsed:8.0f} steps/s, best score {games.score.max()}")
+
+
+def benchArrival(rounds=200) -> None:
+    """Node arrival handling (valid directions, portal, new target) and the per-tick overshoot test:
+    the previous Node dict/list lookups vs the integer NodeGraph tables, access masks and edge distance Entity uses now."""
+    from ghosts import GhostGroup
+    from mazedata import MazeData
+    from nodes import NodeGroup
+    from pacman import Pacman
+
+    mazedata = MazeData()
+    mazedata.loadMaze(0)
+    nodes = NodeGroup("maze1.txt")
+    mazedata.obj.setPortalPairs(nodes)
+    mazedata.obj.connectHomeNodes(nodes)
+    pacman = Pacman(nodes.getNodeFromTiles(15, 26))
+    ghost = GhostGroup(nodes.getStartTempNode(), pacman).blinky
+    nodes.denyHomeAccess(ghost)
+    allNodes = nodes.graph.nodes
+
+    # The previous implementation, straight from the Node dicts; the per-direction
+    # name lists it read are rebuilt from the access masks.
+    names = (PACMAN, BLINKY, PINKY, INKY, CLYDE, FRUIT)
+    for node in allNodes:
+        masks = nodes.graph.access[node.id]
+        node.access = {direction: [name for name in names if masks[k] & 1 << name]
+                       for k, direction in enumerate((UP, DOWN, LEFT, RIGHT))}
+
+    def validDirection(node, direction):
+        if direction is not STOP and ghost.name in node.access[direction]:
+            if node.neighbors[direction] is not None:
+                return True
+        return False
+
+    def newTarget(node, direction):
+        if validDirection(node, direction):
+            return node.neighbors[direction]
+        return node
+
+    def dictArrival(node):
+        directions = [key for key in [UP, DOWN, LEFT, RIGHT]
+                      if validDirection(node, key) and key != ghost.direction * -1] or [ghost.direction * -1]
+        if node.neighbors[PORTAL] is not None:
+            node = node.neighbors[PORTAL]
+        target = newTarget(node, directions[-1])
+        if target is node:
+            target = newTarget(node, ghost.direction)
+        return target
+
+    def graphArrival(node):
+        ghost.nodeId = node.id
+        directions = ghost.validDirections()
+        portal = ghost.graph.links[ghost.nodeId][PORTALSLOT]
+        if portal >= 0:
+            ghost.nodeId = portal
+        target = ghost.getNewTarget(directions[-1])
+        if target == ghost.nodeId:
+            target = ghost.getNewTarget(ghost.direction)
+        return target
+
+    def dictOvershot(node, target, position):
+        return (position - node.position).magnitudeSquared() >= (target.position - node.position).magnitudeSquared()
+
+    ghost.direction = LEFT
+    for name, arrival in (("dict lookups ", dictArrival), ("graph tables ", graphArrival)):
+        start = time.perf_counter()
+        for i in range(rounds):
+            for node in allNodes:
+                arrival(node)
+        elapsed = time.perf_counter() - start
+        print(f"arrival, {name}: {elapsed / (rounds * len(allNodes)) * 1e6:6.2f} us/arrival")
+
+    ghost.setStartNode(allNodes[0])
+    ghost.setBetweenNodes(RIGHT)
+    node, target, position = ghost.node, ghost.target, ghost.position
+    ticks = rounds * len(allNodes)
+    start = time.perf_counter()
+    for i in range(ticks):
+        dictOvershot(node, target, position)
+    dictTime = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(ticks):
+        ghost.overshotTarget()
+    graphTime = time.perf_counter() - start
+    print(f"overshoot, dict lookups : {dictTime / ticks * 1e6:6.2f} us/tick")
+    print(f"overshoot, edge distance: {graphTime / ticks * 1e6:6.2f} us/tick")
+
+
+def benchMovement(ticks=50000) -> None:
+    """Per-tick movement and arrival test: the previous Vector2 step with the squared-distance
+    overshoot test vs the scalar distance along the edge; then whole Pacman and ghost updates."""
+    from controls import RandomControl
+    from ghosts import GhostGroup
+    from nodes import NodeGroup
+    from pacman import Pacman
+
+    nodes = NodeGroup("maze1.txt")
+    graph = nodes.graph
+    pacman = Pacman(nodes.getNodeFromTiles(15, 26))
+    pacman.control = RandomControl(1)
+    ghost = GhostGroup(nodes.getStartTempNode(), pacman).blinky
+    dt = TICKLENGTH * TIMESCALE
+
+    ghost.setStartNode(graph.nodes[0])
+    ghost.setBetweenNodes(RIGHT)
+    ghost.direction = RIGHT
+    edge = graph.lengths[ghost.nodeId][SLOTS[RIGHT]]
+    origin = graph.positions[ghost.nodeId]
+    directions = ghost.directions
+    position = origin.copy()
+    start = time.perf_counter()
+    for i in range(ticks):
+        position += directions[ghost.direction]*ghost.speed*dt
+        vec = position - origin
+        if vec.magnitudeSquared() >= edge:
+            position = origin.copy()
+    vectorTime = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(ticks):
+        ghost.move(dt)
+        if ghost.overshotTarget():
+            ghost.setPosition()
+    scalarTime = time.perf_counter() - start
+    print(f"step + arrival, Vector2      : {vectorTime / ticks * 1e6:6.2f} us/tick")
+    print(f"step + arrival, edge distance: {scalarTime / ticks * 1e6:6.2f} us/tick")
+
+    ghost.reset()
+    for name, entity in (("pacman", pacman), ("ghost ", ghost)):
+        start = time.perf_counter()
+        for i in range(ticks):
+            entity.update(dt)
+        elapsed = time.perf_counter() - start
+        print(f"{name} update: {elapsed / ticks * 1e6:6.2f} us/tick")
+
+
+def benchPaths(queries=20000) -> None:
+    """Shortest-path queries: a Dijkstra search per query vs PathTable lookups (and the table's build cost)."""
+    import heapq
+    import random
+
+    from paths import PathTable
+    from simulation import Simulation
+
+    sim = Simulation(headless=True)
+    sim.startGame()
+    graph = sim.nodes.graph
+    n = len(graph.nodes)
+    pairs = [(random.randrange(n), random.randrange(n)) for i in range(queries)]
+
+    def search(source, goal):
+        best = [float("inf")] * n
+        best[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            length, node = heapq.heappop(heap)
+            if node == goal:
+                return length
+            if length > best[node]:
+                continue
+            for k, other in enumerate(graph.links[node]):
+                if other < 0 or (k < PORTALSLOT and not graph.access[node][k] & 1 << BLINKY):
+                    continue
+                step = length + (graph.lengths[node][k] ** 0.5 if k < PORTALSLOT else 0.0)
+                if step < best[other]:
+                    best[other] = step
+                    heapq.heappush(heap, (step, other))
+        return float("inf")
+
+    start = time.perf_counter()
+    for source, goal in pairs[:queries // 10]:
+        search(source, goal)
+    searched = (time.perf_counter() - start) / (queries // 10)
+    PathTable.tables.clear()
+    start = time.perf_counter()
+    table = PathTable(graph, BLINKY)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    for source, goal in pairs:
+        table.distance(source, goal)
+    looked = (time.perf_counter() - start) / queries
+    print(f"{n} nodes, table ready in {built * 1e3:.1f} ms (computed or loaded from .cache/paths)")
+    print(f"dijkstra per query : {searched * 1e6:8.2f} us")
+    print(f"PathTable lookup   : {looked * 1e6:8.2f} us")
+
+
+def benchRoutes(rounds=200) -> None:
+    """Ghost choices at every node toward a goal node: the greedy goalDirection vs a Routes lookup,
+    and keeping the table current when a door opens or closes: incremental updates vs recomputing it."""
+    from paths import Routes
+    from simulation import Simulation
+
+    sim = Simulation(headless=True)
+    sim.startGame()
+    graph = sim.nodes.graph
+    ghost = sim.ghosts.blinky
+    bit = 1 << BLINKY
+    n = len(graph.nodes)
+    goals = list(range(0, n, 7))
+    cases = [(node, [d for d, k in graph.exits[node] if graph.access[node][k] & bit]) for node in range(n)]
+    cases = [(node, directions) for node, directions in cases if directions]
+
+    def greedy():
+        for goal in goals:
+            ghost.goal = graph.positions[goal]
+            for node, directions in cases:
+                ghost.nodeId = node
+                ghost.goalDirection(directions)
+
+    routes = Routes.get(graph, BLINKY)
+    routes.update()
+
+    def lookup():
+        for goal in goals:
+            for node, directions in cases:
+                routes.firstStep(node, goal, directions)
+
+    decisions = len(goals) * len(cases)
+    for name, func in (("greedy goalDirection", greedy), ("Routes.firstStep", lookup)):
+        start = time.perf_counter()
+        for i in range(rounds // 20):
+            func()
+        elapsed = (time.perf_counter() - start) / (rounds // 20 * decisions)
+        print(f"{name:21s}: {elapsed * 1e6:6.2f} us per decision")
+
+    home = sim.nodes.nodesLUT[sim.nodes.homekey].id
+    opened = closed = 0.0
+    for i in range(rounds):
+        start = time.perf_counter()
+        graph.denyAccess(home, DOWN, bit)
+        routes.update()
+        middle = time.perf_counter()
+        graph.allowAccess(home, DOWN, bit)
+        end = time.perf_counter()
+        closed += middle - start
+        opened += end - middle
+    start = time.perf_counter()
+    for i in range(rounds // 20):
+        routes.stale = True
+        routes.update()
+    rebuilt = (time.perf_counter() - start) / (rounds // 20)
+    print(f"open home door (incremental)   : {opened / rounds * 1e3:.3f} ms")
+    print(f"close home door (incremental)  : {closed / rounds * 1e3:.3f} ms")
+    print(f"rebuild next-hop from the paths: {rebuilt * 1e3:.3f} ms")
+
+
+def benchMazeLoad(rounds=50) -> None:
+    """Level load from the maze text: parsing the files (four loadtxt calls, as every level did)
+    and walking the grids vs memory-mapping the compiled artifact; plus building the level from it."""
+    import numpy as np
+
+    from mazedata import CompiledMaze, MazeFiles
+    from nodes import NodeGroup
+    from pellets import PelletGroup
+
+    name = "maze1"
+    maze = CompiledMaze(name) # 確保 .cache/mazes 裡已有編譯結果
+    start = time.perf_counter()
+    for i in range(rounds):
+        grids = [np.loadtxt(name+".txt", dtype="<U1") for k in range(3)]
+        maze.compile(grids[0], np.loadtxt(name+"_rotation.txt", dtype="<U1"))
+    parsed = (time.perf_counter() - start) / rounds
+    start = time.perf_counter()
+    for i in range(rounds):
+        CompiledMaze(name)
+    mapped = (time.perf_counter() - start) / rounds
+    MazeFiles.compiled(name)
+    start = time.perf_counter()
+    for i in range(rounds):
+        NodeGroup(name+".txt")
+        PelletGroup(name+".txt")
+    built = (time.perf_counter() - start) / rounds
+    print(f"parse text + walk grids  : {parsed * 1e3:7.3f} ms")
+    print(f"mmap compiled artifact   : {mapped * 1e3:7.3f} ms")
+    print(f"NodeGroup + PelletGroup  : {built * 1e3:7.3f} ms (from the compiled tables)")
+
+
+def benchLevelSwitch(rounds=20) -> None:
+    """The frame a cleared level's pause ends on: building the next level then vs taking the preloaded one."""
+    from main import GameController
+
+    game = GameController()
+    game.startGame()
+    for preload in (False, True):
+        elapsed = 0.0
+        for i in range(rounds):
+            if preload:
+                game.sim.preloadLevel(game.level + 1)
+                game.preloadPresentation()
+                while game.presented is None: # 暫停有 3 秒，早就一幀一步建完
+                    game.stepPresentation()
+            start = time.perf_counter()
+            game.sim.nextLevel()
+            game.handle_sim_events()
+            elapsed += time.perf_counter() - start
+        name = "preloaded during pause" if preload else "built on the frame"
+        print(f"{name:23s}: {elapsed / rounds * 1e3:6.2f} ms")
+
+
+def benchPellets(frames=2000) -> None:
+    """Per-frame pellet eating check and removal: the old linear scan / list.remove vs the tile grid,
+    and a magnet absorption: the per-pellet loop vs within(); on maze1 and on 3x3 copies of it."""
+    import random
+    import tempfile
+
+    import numpy as np
+
+    from pellets import PelletGroup
+    from vector import Vector2
+
+    def linear(pelletList, position, radius):
+        for pellet in pelletList:
+            d = position - pellet.position
+            if d.magnitudeSquared() <= (radius + pellet.collideRadius)**2:
+                return pellet
+        return None
+
+    with tempfile.TemporaryDirectory() as directory:
+        big = os.path.join(directory, "bigmaze")
+        for suffix in (".txt", "_rotation.txt"):
+            grid = np.loadtxt("maze1"+suffix, dtype="<U1")
+            np.savetxt(big+suffix, np.tile(grid, (3, 3)), fmt="%s")
+        for mazefile in ("maze1.txt", big+".txt"):
+            group = PelletGroup(mazefile)
+            rng = random.Random(1)
+            positions = [rng.choice(group.pelletList).position + Vector2(rng.uniform(-8, 8), rng.uniform(-8, 8))
+                         for i in range(frames)]
+            start = time.perf_counter()
+            for position in positions:
+                linear(group.pelletList, position, 5)
+            scanned = (time.perf_counter() - start) / frames
+            start = time.perf_counter()
+            for position in positions:
+                group.collide(position, 5)
+            looked = (time.perf_counter() - start) / frames
+            order = list(group.pelletList)
+            rng.shuffle(order)
+            copy = list(order)
+            start = time.perf_counter()
+            for pellet in order:
+                copy.remove(pellet)
+            removed = (time.perf_counter() - start) / len(order)
+            start = time.perf_counter()
+            for pellet in order:
+                group.removePellet(pellet)
+            swapped = (time.perf_counter() - start) / len(order)
+            print(f"{len(order):5d} pellets: eat check {scanned * 1e6:7.2f} -> {looked * 1e6:5.2f} us, "
+                  f"removal {removed * 1e6:6.2f} -> {swapped * 1e6:5.2f} us")
+
+            # 磁鐵吸收：複製整個列表逐顆算距離再 list.remove vs within() + removePellets()
+            rounds = 20
+            centres = [rng.choice(PelletGroup(mazefile).pelletList).position for i in range(rounds)]
+            radius = TILEWIDTH * 4
+            elapsed = [0.0, 0.0]
+            for centre in centres:
+                group = PelletGroup(mazefile)
+                start = time.perf_counter()
+                for pellet in list(group.pelletList):
+                    if pellet.name in (PELLET, POWERPELLET) and pellet.visible:
+                        if (centre - pellet.position).magnitudeSquared() <= radius**2:
+                            group.pelletList.remove(pellet)
+                elapsed[0] += time.perf_counter() - start
+                group = PelletGroup(mazefile)
+                start = time.perf_counter()
+                group.removePellets([pellet for pellet in group.within(centre, radius, (PELLET, POWERPELLET)) if pellet.visible])
+                elapsed[1] += time.perf_counter() - start
+            print(f"{'':14s} magnet absorption {elapsed[0] / rounds * 1e6:7.1f} -> {elapsed[1] / rounds * 1e6:5.1f} us")
+
+
+def benchCollisions(frames=200) -> None:
+    """Per-tick contact search: bullets x ghosts rect tests plus per-ghost distance checks vs the binned CollisionStage,
+    with ghosts and bullets spread over the screen."""
+    import random
+    from types import SimpleNamespace
+
+    from bullet import BulletPool
+    from collision import CollisionStage
+    from nodes import NodeGroup
+    from pacman import Pacman
+    from vector import Vector2
+
+    nodes = NodeGroup("maze1.txt")
+    pacman = Pacman(nodes.getStartTempNode())
+    stage = CollisionStage()
+    ghostRect = pygame.Rect(0, 0, 2*TILEWIDTH, 2*TILEHEIGHT)
+    rng = random.Random(1)
+    for numGhosts, numBullets in ((4, 16), (16, 64), (64, 256), (256, 1024)):
+        ghosts = [SimpleNamespace(position=Vector2(rng.uniform(0, SCREENWIDTH), rng.uniform(0, SCREENHEIGHT)), collideRadius=5)
+                  for i in range(numGhosts)]
+        bullets = BulletPool(numBullets)
+        for slot in range(numBullets):
+            bullets.fire(Vector2(rng.uniform(0, SCREENWIDTH), rng.uniform(0, SCREENHEIGHT)), STOP)
+        start = time.perf_counter()
+        for frame in range(frames):
+            nested = []
+            for ghost in ghosts:
+                for slot in bullets.activeSlots():
+                    ghostRect.center = ghost.position.asInt()
+                    if bullets.rects[slot].colliderect(ghostRect):
+                        nested.append((ghost, slot))
+                pacman.collideCheck(ghost)
+        looped = (time.perf_counter() - start) / frames
+        start = time.perf_counter()
+        for frame in range(frames):
+            contacts = stage.detect(pacman, ghosts, None, bullets)
+        binned = (time.perf_counter() - start) / frames
+        assert [(contact.entity, contact.slot) for contact in contacts] == nested
+        print(f"{numGhosts:4d} ghosts {numBullets:5d} bullets: {looped * 1e3:8.3f} -> {binned * 1e3:6.3f} ms"
+              f" ({len(contacts)} contacts)")
+
+
+BENCHMARKS = {"sprites": benchSpriteUpdate, "simulation": benchSimulation, "batch": benchBatch, "arrival": benchArrival,
+              "movement": benchMovement, "paths": benchPaths, "routes": benchRoutes, "mazeload": benchMazeLoad,
+              "levelswitch": benchLevelSwitch, "pellets": benchPellets,
+              "collisions": benchCollisions}
+
+
+if __name__ == "__main__":
+    setupDisplay()
+    for name in sys.argv[1:] or list(BENCHMARKS):
+        print(f"[{name}]")
+        BENCHMARKS[name]()
@@ -1,35 +1,67 @@
+import numpy as np
 import pygame
 
 from constants import *
-from vector import Vector2
+from sprites import SpriteAtlas
 
 
-class Bullet:
-    """子彈物件，負責移動、繪製與碰撞."""
+class BulletPool:
+    """子彈池：固定容量的子彈物件，負責移動、繪製與碰撞.
 
-    def __init__(self, position: Vector2, direction: int) -> None:
-        self.position = position.copy()
-        self.direction = direction
-        self.speed = 400  # 子彈速度，可調整
-        self.image = pygame.image.load("bullet.png").convert_alpha()
-        self.image = pygame.transform.scale(self.image, (TILEWIDTH, TILEHEIGHT))
-        self.rect = self.image.get_rect(center=self.position.asInt())
-        self.active = True
+    Positions and velocities live in preallocated NumPy arrays and every slot
+    owns one pygame.Rect, so firing reuses a free slot instead of creating
+    objects. All bullets share one pre-scaled image. When every slot is in
+    use the oldest bullet is recycled.
+    """
+
+    def __init__(self, capacity: int = 16, speed: float = 400, headless: bool = False) -> None:
+        self.capacity = capacity
+        self.speed = speed  # 子彈速度，可調整
+        self.image = None if headless else SpriteAtlas.getImage("bullet.png", (TILEWIDTH, TILEHEIGHT))
+        self.positions = np.zeros((capacity, 2))
+        self.velocities = np.zeros((capacity, 2))
+        self.active = np.zeros(capacity, dtype=bool)
+        self.born = np.zeros(capacity, dtype=np.int64)
+        self.rects = [pygame.Rect(0, 0, TILEWIDTH, TILEHEIGHT) for _ in range(capacity)]
+        self.fired = 0
+        self.velocityOf = {LEFT: (-1, 0), RIGHT: (1, 0), UP: (0, -1), DOWN: (0, 1)}
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.active))
+
+    def fire(self, position, direction: int) -> int:
+        """Place a bullet at position moving in direction; return its slot."""
+        free = np.flatnonzero(~self.active)
+        slot = int(free[0]) if len(free) else int(np.argmin(self.born))
+        self.positions[slot] = position.x, position.y
+        dx, dy = self.velocityOf.get(direction, (0, 0))
+        self.velocities[slot] = dx * self.speed, dy * self.speed
+        self.active[slot] = True
+        self.fired += 1
+        self.born[slot] = self.fired
+        self.rects[slot].center = (int(position.x), int(position.y))
+        return slot
+
+    def release(self, slot: int) -> None:
+        self.active[slot] = False
+        self.velocities[slot] = 0
+
+    def activeSlots(self) -> list:
+        return np.flatnonzero(self.active).tolist()
 
     def update(self, dt: float) -> None:
-        if self.direction == LEFT:
-            self.position.x -= self.speed * dt
-        elif self.direction == RIGHT:
-            self.position.x += self.speed * dt
-        elif self.direction == UP:
-            self.position.y -= self.speed * dt
-        elif self.direction == DOWN:
-            self.position.y += self.speed * dt
-        self.rect.center = self.position.asInt()
+        self.positions += self.velocities * dt
         # 只在超出畫面時消失
-        if (self.position.x < 0 or self.position.x > SCREENWIDTH or
-            self.position.y < 0 or self.position.y > SCREENHEIGHT):
-            self.active = False
+        x = self.positions[:, 0]
+        y = self.positions[:, 1]
+        self.active &= (x >= 0) & (x <= SCREENWIDTH) & (y >= 0) & (y <= SCREENHEIGHT)
+        self.velocities[~self.active] = 0
+        for slot in self.activeSlots():
+            self.rects[slot].center = (int(x[slot]), int(y[slot]))
+
+    def clear(self) -> None:
+        self.active[:] = False
+        self.velocities[:] = 0
 
-    def render(self, screen) -> None:
-        screen.blit(self.image, self.rect)
+    def render(self, screen) -> list:
+        return [screen.blit(self.image, self.rects[slot]) for slot in self.activeSlots()]
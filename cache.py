@@ -0,0 +1,29 @@
+"""Content-addressed on-disk cache shared by the build-once game assets."""
+import hashlib
+import os
+
+CACHEDIR = ".cache"
+
+_digests = {}
+
+
+def fileDigest(filename):
+    """Return the SHA-1 of a file's contents, re-reading it only when it changes on disk."""
+    stat = os.stat(filename)
+    key = (filename, stat.st_mtime_ns, stat.st_size)
+    if key not in _digests:
+        with open(filename, "rb") as f:
+            _digests[key] = hashlib.sha1(f.read()).hexdigest()
+    return _digests[key]
+
+
+def keyDigest(*parts):
+    """Collapse a cache key made of strings and numbers into a short file-name-safe digest."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+
+def cachePath(section, filename):
+    """Return the path of a cache entry, creating its section directory on demand."""
+    directory = os.path.join(CACHEDIR, section)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, filename)
@@ -0,0 +1,67 @@
+from collections import defaultdict, namedtuple
+
+import pygame
+
+from constants import *
+
+# 接觸的種類
+BULLETGHOST = 0
+PACMANGHOST = 1
+PACMANFRUIT = 2
+
+# entity 是被碰到的鬼魂或水果，slot 是子彈的欄位 (其他種類為 None)
+Contact = namedtuple("Contact", "kind entity slot")
+
+
+class CollisionStage:
+    """Finds the contacts between Pacman, the ghosts, the fruit and the bullets in one pass per tick.
+
+    Ghosts and active bullets are binned into CELL-sized squares, and each
+    ghost or Pacman only tests what lies in its own and the eight
+    neighbouring cells, so the cost grows with the number of entities and
+    not with bullets * ghosts. Contacts are purely geometric (the same
+    rect and radius tests as before); whether they count is up to the
+    caller. They are listed per ghost in GhostGroup order, bullets by slot
+    before Pacman, then the fruit.
+    """
+    CELL = 2 * TILEWIDTH # 子彈與鬼魂矩形相交時中心最多相差 24 像素，一格必須比它大
+
+    def __init__(self) -> None:
+        self.bullets = defaultdict(list)
+        self.ghosts = defaultdict(list)
+        self.ghostRect = pygame.Rect(0, 0, 2*TILEWIDTH, 2*TILEHEIGHT) # 鬼魂圖片的大小
+
+    def cellOf(self, x, y) -> tuple:
+        return int(x // self.CELL), int(y // self.CELL)
+
+    def nearby(self, cells, x, y):
+        col, row = self.cellOf(x, y)
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                yield from cells.get((col + dx, row + dy), ())
+
+    def detect(self, pacman, ghosts, fruit=None, bullets=None) -> list:
+        self.bullets.clear()
+        self.ghosts.clear()
+        if bullets is not None:
+            slots = bullets.activeSlots()
+            for slot, (x, y) in zip(slots, bullets.positions[slots].tolist()):
+                self.bullets[self.cellOf(x, y)].append(slot)
+        ghosts = list(ghosts)
+        for ghost in ghosts:
+            self.ghosts[self.cellOf(ghost.position.x, ghost.position.y)].append(ghost)
+        touching = {id(ghost) for ghost in self.nearby(self.ghosts, pacman.position.x, pacman.position.y)
+                    if pacman.collideCheck(ghost)}
+
+        contacts = []
+        for ghost in ghosts:
+            if self.bullets:
+                self.ghostRect.center = ghost.position.asInt()
+                for slot in sorted(self.nearby(self.bullets, ghost.position.x, ghost.position.y)):
+                    if bullets.rects[slot].colliderect(self.ghostRect):
+                        contacts.append(Contact(BULLETGHOST, ghost, slot))
+            if id(ghost) in touching:
+                contacts.append(Contact(PACMANGHOST, ghost, None))
+        if fruit is not None and pacman.collideCheck(fruit):
+            contacts.append(Contact(PACMANFRUIT, fruit, None))
+        return contacts
@@ -6,6 +6,14 @@ SCREENWIDTH = NCOLS*TILEWIDTH
 SCREENHEIGHT = NROWS*TILEHEIGHT
 SCREENSIZE = (SCREENWIDTH, SCREENHEIGHT)
 
+TICKRATE = 60 # 模擬每(真實)秒固定更新次數
+TIMESCALE = 0.8 # 每真實秒的遊戲秒數 (原本 dt = ms / 1250)
+TICKLENGTH = 1.0 / TICKRATE
+FRAMERATE = 120 # 畫面更新上限，與遊戲速度無關
+MAXFRAMETIME = 0.25 # 卡頓時最多補上的真實秒數
+TIMEMULTIPLIERS = (1, 4, 16, 0) # 快轉倍率，0 = 不限速
+FASTPRESENTRATE = 30 # 快轉時每秒更新畫面次數
+
 BLACK = (0, 0, 0)
 YELLOW = (255, 255, 0)
 WHITE = (255, 255, 255)
@@ -20,6 +28,8 @@ GREY = (128, 128, 128)
 LIMEGREEN = (50, 205, 50)
 PURPLE = (128, 0, 128)
 
+INVISIBLEALPHA = 128
+
 STOP = 0
 UP = 1
 DOWN = -1
@@ -54,3 +64,17 @@ PAUSETXT = 3
 GAMEOVERTXT = 4
 HISCORELABELTXT = 5
 HISCOREVALUETXT = 6
+
+#模擬事件 (Simulation.popEvents)
+LEVELSTART = 0
+NEXTLEVEL = 1
+LEVELCLEARED = 2
+PELLETEATEN = 3
+GHOSTEATEN = 4
+FRUITEATEN = 5
+POINTSEARNED = 6
+PACMANDIED = 7
+GAMEOVER = 8
+RESTART = 9
+READY = 10
+EXTRALIFE = 11
@@ -0,0 +1,49 @@
+import random
+
+import pygame
+from pygame.locals import *
+
+from constants import *
+
+
+class KeyboardControl:
+    """Steer Pacman with the arrow keys (the default)."""
+
+    def getDirection(self, pacman):
+        key_pressed = pygame.key.get_pressed()
+        if key_pressed[K_UP]:
+            return UP
+        if key_pressed[K_DOWN]:
+            return DOWN
+        if key_pressed[K_LEFT]:
+            return LEFT
+        if key_pressed[K_RIGHT]:
+            return RIGHT
+        return STOP
+
+
+class ScriptedControl:
+    """Replay a fixed sequence of directions, one per tick; STOP once it runs out."""
+
+    def __init__(self, directions) -> None:
+        self.directions = iter(directions)
+
+    def getDirection(self, pacman):
+        return next(self.directions, STOP)
+
+
+class RandomControl:
+    """Hold a random direction for a few ticks at a time; a baseline bot for soak tests."""
+
+    def __init__(self, seed=None, hold=15) -> None:
+        self.random = random.Random(seed)
+        self.hold = hold
+        self.ticks = 0
+        self.direction = STOP
+
+    def getDirection(self, pacman):
+        if self.ticks == 0:
+            self.direction = self.random.choice((UP, DOWN, LEFT, RIGHT))
+            self.ticks = self.hold
+        self.ticks -= 1
+        return self.direction
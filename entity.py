@@ -1,15 +1,19 @@
-from random import randint
+import random
 
 import pygame
 from pygame.locals import *
 
 from constants import *
+from nodes import PORTALSLOT, SLOTS
+from paths import Routes
 from vector import Vector2
 
 
 class Entity:
-    def __init__(self, node) -> None:
+    def __init__(self, node, headless=False, rng=None) -> None:
         self.name = None
+        self.headless = headless # 不載入圖片，sprites 用 NullSprites
+        self.random = random if rng is None else rng # 模擬各自的 random.Random；預設是全域的
         self.directions = {UP:Vector2(0, -1),DOWN:Vector2(0, 1),
                           LEFT:Vector2(-1, 0), RIGHT:Vector2(1, 0), STOP:Vector2()}
         self.direction = STOP
@@ -20,76 +24,113 @@ class Entity:
         self.visible = True
         self.disablePortal = False
         self.goal = None
+        self.goalNode = None # 目標剛好是節點時用 Routes 查表，否則用 goal 位置貪婪選方向
         self.directionMethod = self.randomDirection
+        self.graph = node.graph
         self.setStartNode(node)
         self.image = None
+        self.prevPosition = None # 上一個模擬 tick 開始時的位置
+        self.renderPosition = None
+
+    # 移動使用 graph 的節點編號 (nodeId, targetId)；node / target 是對應的 Node
+    # 實體的狀態是所在的邊 (nodeId -> targetId) 與沿著邊走過的距離 travelled (像素)
+    @property
+    def node(self):
+        return self.graph.nodes[self.nodeId]
+
+    @node.setter
+    def node(self, node) -> None:
+        self.nodeId = node.id
+
+    @property
+    def target(self):
+        return self.graph.nodes[self.targetId]
+
+    @target.setter
+    def target(self, node) -> None:
+        self.setTarget(node.id)
+
+    def setTarget(self, target) -> None:
+        self.targetId = target
+        self.length, self.unit = self.graph.edge(self.nodeId, target) # 邊長 (像素) 與單位方向
+
+    @property
+    def position(self):
+        """Pixel position, derived from the edge and the distance travelled along it."""
+        origin = self.graph.positions[self.nodeId]
+        return Vector2(origin.x + self.unit[0]*self.travelled, origin.y + self.unit[1]*self.travelled)
 
     def setPosition(self) -> None:
-        self.position = self.node.position.copy()
+        self.travelled = 0.0
+
+    def move(self, dt) -> None:
+        if self.direction is not STOP:
+            self.travelled += self.speed*dt
 
     def update(self, dt) -> None:
-        self.position += self.directions[self.direction]*self.speed*dt
+        self.move(dt)
 
         if self.overshotTarget():
-            self.node = self.target
+            self.nodeId = self.targetId
             directions = self.validDirections()
             direction = self.directionMethod(directions)
             if not self.disablePortal:
-                if self.node.neighbors[PORTAL] is not None:
-                    self.node = self.node.neighbors[PORTAL]
-            self.target = self.getNewTarget(direction)
-            if self.target is not self.node:
+                portal = self.graph.links[self.nodeId][PORTALSLOT]
+                if portal >= 0:
+                    self.nodeId = portal
+            target = self.getNewTarget(direction)
+            if target != self.nodeId:
                 self.direction = direction
             else:
-                self.target = self.getNewTarget(self.direction)
-
+                target = self.getNewTarget(self.direction)
+            self.setTarget(target)
             self.setPosition()
 
     def validDirection(self, direction) -> bool:
-        if direction is not STOP and self.name in self.node.access[direction]:
-            if self.node.neighbors[direction] is not None:
-                return True
+        if direction is not STOP:
+            slot = SLOTS[direction]
+            if self.graph.links[self.nodeId][slot] >= 0:
+                return bool(self.graph.access[self.nodeId][slot] & 1 << self.name)
         return False
 
     def getNewTarget(self, direction):
+        """Id of the neighbour in direction when the move is allowed, else of the current node."""
         if self.validDirection(direction):
-            return self.node.neighbors[direction]
-        return self.node
+            return self.graph.links[self.nodeId][SLOTS[direction]]
+        return self.nodeId
 
     def overshotTarget(self):
-        if self.target is not None:
-            vec1 = self.target.position - self.node.position
-            vec2 = self.position - self.node.position
-            node2Target = vec1.magnitudeSquared()
-            node2Self = vec2.magnitudeSquared()
-            return node2Self >= node2Target
-        return False
+        return self.travelled >= self.length
 
     def reverseDirection(self) -> None:
         self.direction *= -1
-        temp = self.node
-        self.node = self.target
-        self.target = temp
+        self.nodeId, self.targetId = self.targetId, self.nodeId
+        self.unit = (-self.unit[0], -self.unit[1])
+        self.travelled = self.length - self.travelled
 
     def oppositeDirection(self, direction) -> bool:
         return bool(direction is not STOP and direction == self.direction * -1)
 
     def validDirections(self):
-        directions = []
-        for key in [UP, DOWN, LEFT, RIGHT]:
-            if self.validDirection(key) and key != self.direction * -1:
-                directions.append(key)
+        access = self.graph.access[self.nodeId]
+        bit = 1 << self.name
+        back = self.direction * -1
+        directions = [key for key, slot in self.graph.exits[self.nodeId] if key != back and access[slot] & bit]
         if len(directions) == 0:
-            directions.append(self.direction * -1)
+            directions.append(back)
         return directions
 
     def randomDirection(self, directions):
-        return directions[randint(0, len(directions)-1)]
+        return directions[self.random.randint(0, len(directions)-1)]
 
     def goalDirection(self, directions):
+        if self.goalNode is not None and self.goalNode.id != self.nodeId:
+            direction = Routes.get(self.graph, self.name).firstStep(self.nodeId, self.goalNode.id, directions)
+            if direction is not None:
+                return direction
         distances = []
         for direction in directions:
-            vec = self.node.position  + self.directions[direction]*TILEWIDTH - self.goal
+            vec = self.graph.positions[self.nodeId] + self.directions[direction]*TILEWIDTH - self.goal
             distances.append(vec.magnitudeSquared())
         index = distances.index(min(distances))
         return directions[index]
@@ -101,9 +142,10 @@ class Entity:
         self.setPosition()
 
     def setBetweenNodes(self, direction) -> None:
-        if self.node.neighbors[direction] is not None:
-            self.target = self.node.neighbors[direction]
-            self.position = (self.node.position + self.target.position) / 2.0
+        target = self.graph.links[self.nodeId][SLOTS[direction]]
+        if target >= 0:
+            self.setTarget(target)
+            self.travelled = self.length / 2.0
 
     def reset(self) -> None:
         self.setStartNode(self.startNode)
@@ -111,15 +153,27 @@ class Entity:
         self.speed = 100
         self.visible = True
 
+    def interpolate(self, alpha) -> None:
+        """Place the drawn entity alpha of the way from its previous tick position to its current one.
+
+        Jumps longer than a tile (portals, teleports, resets) are not smoothed.
+        """
+        if self.prevPosition is None or (self.position - self.prevPosition).magnitudeSquared() > TILEWIDTH**2:
+            self.renderPosition = self.position
+        else:
+            self.renderPosition = self.prevPosition + (self.position - self.prevPosition) * alpha
+
     def setSpeed(self, speed) -> None:
         self.speed = speed * TILEWIDTH / 16
 
-    def render(self, screen) -> None:
+    def render(self, screen):
+        """Draw the entity and return the screen rect it covered (None when hidden)."""
         if self.visible:
+            position = self.position if self.renderPosition is None else self.renderPosition
             if self.image is not None:
                 adjust = Vector2(TILEWIDTH, TILEHEIGHT) / 2
-                p = self.position - adjust
-                screen.blit(self.image, p.asTuple())
-            else:
-                p = self.position.asInt()
-                pygame.draw.circle(screen, self.color, p, self.radius)
+                p = position - adjust
+                return screen.blit(self.image, p.asTuple())
+            p = position.asInt()
+            return pygame.draw.circle(screen, self.color, p, self.radius)
+        return None
@@ -1,19 +1,20 @@
 from constants import *
 from entity import Entity
-from sprites import FruitSprites
+from sprites import FruitSprites, entitySprites
 
 
 class Fruit(Entity):
-    def __init__(self, node, level=0) -> None:
-        Entity.__init__(self, node)
+    def __init__(self, node, level=0, headless=False) -> None:
+        Entity.__init__(self, node, headless)
         self.name = FRUIT
         self.color = GREEN
         self.lifespan = 5
         self.timer = 0
         self.destroy = False
         self.points = 100 + level*20
+        self.kind = level % len(FruitSprites.fruits)
         self.setBetweenNodes(RIGHT)
-        self.sprites = FruitSprites(self, level)
+        self.sprites = entitySprites(FruitSprites, self, level)
 
     def update(self, dt) -> None:
         self.timer += dt
@@ -3,13 +3,13 @@ from pygame.locals import *
 from constants import *
 from entity import Entity
 from modes import ModeController
-from sprites import GhostSprites
+from sprites import GhostSprites, entitySprites
 from vector import Vector2
 
 
 class Ghost(Entity):
-    def __init__(self, node, pacman=None, blinky=None) -> None:
-        Entity.__init__(self, node)
+    def __init__(self, node, pacman=None, blinky=None, headless=False, rng=None) -> None:
+        Entity.__init__(self, node, headless, rng)
         self.name = GHOST
         self.points = 200
         self.goal = Vector2()
@@ -28,8 +28,10 @@ class Ghost(Entity):
         self.sprites.update(dt)
         self.mode.update(dt)
         if self.mode.current is SCATTER:
+            self.goalNode = None
             self.scatter()
         elif self.mode.current is CHASE:
+            self.goalNode = None
             self.chase()
         Entity.update(self, dt)
 
@@ -41,6 +43,7 @@ class Ghost(Entity):
 
     def spawn(self) -> None:
         self.goal = self.spawnNode.position
+        self.goalNode = self.spawnNode
 
     def setSpawnNode(self, node) -> None:
         self.spawnNode = node
@@ -56,6 +59,7 @@ class Ghost(Entity):
         self.mode.setFreightMode()
         if self.mode.current == FREIGHT:
             self.setSpeed(50)
+            self.goalNode = None
             self.directionMethod = self.randomDirection
 
     def normalMode(self) -> None:
@@ -67,19 +71,23 @@ class Ghost(Entity):
 
 
 class Blinky(Ghost):
-    def __init__(self, node, pacman=None, blinky=None) -> None:
-        Ghost.__init__(self, node, pacman, blinky)
+    def __init__(self, node, pacman=None, blinky=None, headless=False, rng=None) -> None:
+        Ghost.__init__(self, node, pacman, blinky, headless, rng)
         self.name = BLINKY
         self.color = RED
-        self.sprites = GhostSprites(self)
+        self.sprites = entitySprites(GhostSprites, self)
+
+    def chase(self) -> None:
+        self.goal = self.pacman.position
+        self.goalNode = self.pacman.target
 
 
 class Pinky(Ghost):
-    def __init__(self, node, pacman=None, blinky=None) -> None:
-        Ghost.__init__(self, node, pacman, blinky)
+    def __init__(self, node, pacman=None, blinky=None, headless=False, rng=None) -> None:
+        Ghost.__init__(self, node, pacman, blinky, headless, rng)
         self.name = PINKY
         self.color = PINK
-        self.sprites = GhostSprites(self)
+        self.sprites = entitySprites(GhostSprites, self)
 
     def scatter(self) -> None:
         self.goal = Vector2(TILEWIDTH*NCOLS, 0)
@@ -89,11 +97,11 @@ class Pinky(Ghost):
 
 
 class Inky(Ghost):
-    def __init__(self, node, pacman=None, blinky=None) -> None:
-        Ghost.__init__(self, node, pacman, blinky)
+    def __init__(self, node, pacman=None, blinky=None, headless=False, rng=None) -> None:
+        Ghost.__init__(self, node, pacman, blinky, headless, rng)
         self.name = INKY
         self.color = TEAL
-        self.sprites = GhostSprites(self)
+        self.sprites = entitySprites(GhostSprites, self)
 
     def scatter(self) -> None:
         self.goal = Vector2(TILEWIDTH*NCOLS, TILEHEIGHT*NROWS)
@@ -105,11 +113,11 @@ class Inky(Ghost):
 
 
 class Clyde(Ghost):
-    def __init__(self, node, pacman=None, blinky=None) -> None:
-        Ghost.__init__(self, node, pacman, blinky)
+    def __init__(self, node, pacman=None, blinky=None, headless=False, rng=None) -> None:
+        Ghost.__init__(self, node, pacman, blinky, headless, rng)
         self.name = CLYDE
         self.color = ORANGE
-        self.sprites = GhostSprites(self)
+        self.sprites = entitySprites(GhostSprites, self)
 
     def scatter(self) -> None:
         self.goal = Vector2(0, TILEHEIGHT*NROWS)
@@ -124,11 +132,11 @@ class Clyde(Ghost):
 
 
 class GhostGroup:
-    def __init__(self, node, pacman) -> None:
-        self.blinky = Blinky(node, pacman)
-        self.pinky = Pinky(node, pacman)
-        self.inky = Inky(node, pacman, self.blinky)
-        self.clyde = Clyde(node, pacman)
+    def __init__(self, node, pacman, headless=False, rng=None) -> None:
+        self.blinky = Blinky(node, pacman, None, headless, rng)
+        self.pinky = Pinky(node, pacman, None, headless, rng)
+        self.inky = Inky(node, pacman, self.blinky, headless, rng)
+        self.clyde = Clyde(node, pacman, None, headless, rng)
         self.ghosts = [self.blinky, self.pinky, self.inky, self.clyde]
 
     def __iter__(self):
@@ -171,7 +179,6 @@ class GhostGroup:
         for ghost in self:
             ghost.reset()
 
-    def render(self, screen) -> None:
-        for ghost in self:
-            ghost.render(screen)
+    def render(self, screen) -> list:
+        return [ghost.render(screen) for ghost in self]
 
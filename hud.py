@@ -0,0 +1,55 @@
+import pygame
+
+from constants import *
+
+
+class HudLayer:
+    """The rarely changing HUD (lives, captured fruit, static labels) composited into two strips.
+
+    Each strip is rebuilt only when what it shows changes, and a rebuilt
+    strip is a new Surface, so the dirty-rect renderer repaints just that
+    strip's region. Otherwise the HUD costs one blit per strip.
+    """
+
+    def __init__(self) -> None:
+        self.regions = {"top": pygame.Rect(0, 0, SCREENWIDTH, TILEHEIGHT),
+                        "bottom": pygame.Rect(0, SCREENHEIGHT - 2*TILEHEIGHT, SCREENWIDTH, 2*TILEHEIGHT)}
+        self.strips = {}
+        self.signatures = {}
+
+    def update(self, lives, fruitCaptured, labels) -> None:
+        """Rebuild the strips whose contents changed.
+
+        lives and fruitCaptured are lists of images, labels the static Text
+        objects; the layout matches the original per-frame blits.
+        """
+        blits = {name: [] for name in self.regions}
+        for text in labels:
+            x, y = text.position.asTuple()
+            for name, region in self.regions.items():
+                if region.collidepoint(x, y):
+                    blits[name].append((text.label, (x, y)))
+        for i, image in enumerate(lives):
+            blits["bottom"].append((image, (image.get_width() * i, SCREENHEIGHT - image.get_height())))
+        for i, image in enumerate(fruitCaptured):
+            blits["bottom"].append((image, (SCREENWIDTH - image.get_width() * (i+1), SCREENHEIGHT - image.get_height())))
+
+        for name, region in self.regions.items():
+            signature = [(id(surface), topleft) for surface, topleft in blits[name]]
+            if signature != self.signatures.get(name):
+                self.strips[name] = self.buildStrip(region, blits[name])
+                self.signatures[name] = signature
+
+    def buildStrip(self, region, blits):
+        strip = pygame.Surface(region.size, pygame.SRCALPHA)
+        for surface, (x, y) in blits:
+            strip.blit(surface, (x - region.x, y - region.y))
+        return strip
+
+    def getItems(self) -> dict:
+        """Return the strips as key -> (surface, topleft)."""
+        return {("hud", name): (self.strips[name], self.regions[name].topleft) for name in self.strips}
+
+    def render(self, screen) -> None:
+        for surface, topleft in self.getItems().values():
+            screen.blit(surface, topleft)
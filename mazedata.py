@@ -1,6 +1,113 @@
+import os
+
+import numpy as np
+
+from cache import cachePath, fileDigest, keyDigest
 from constants import *
 
 
+class CompiledMaze:
+    """A maze's text files (mazeN.txt, mazeN_rotation.txt) compiled to tables.
+
+    Everything a level needs from the text is one int32 .npy under
+    .cache/mazes, named by the files' contents and memory-mapped on load:
+    a header, then the nodes (col, row) in reading order, the horizontal
+    and vertical links (node indices, in NodeGroup's connect order), the
+    pellets (row, col, symbol) and the background tiles (row, col, tile,
+    rotation; tile -1 is the ghost-house door "=").
+    """
+    VERSION = 1
+    nodeSymbols = ["+", "P", "n", "T", "t", "I", "i", "S", "s", "M", "m"]
+    pathSymbols = [".", "-", "|", "p"]
+    pelletSymbols = [".", "+", "P", "p", "T", "I", "S", "M"]
+    WIDTHS = (2, 2, 2, 3, 4) # nodes, horizontal, vertical, pellets, tiles
+
+    def __init__(self, name) -> None:
+        self.name = name
+        mazefile, rotfile = name+".txt", name+"_rotation.txt"
+        key = keyDigest("maze", self.VERSION, fileDigest(mazefile), fileDigest(rotfile))
+        path = cachePath("mazes", key + ".npy")
+        try:
+            data = np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            data = self.compile(np.loadtxt(mazefile, dtype="<U1"), np.loadtxt(rotfile, dtype="<U1"))
+            self.save(data, path)
+        self.rows, self.cols = int(data[1]), int(data[2])
+        offset = 3 + len(self.WIDTHS)
+        tables = []
+        for count, width in zip(data[3:offset].tolist(), self.WIDTHS):
+            tables.append(data[offset:offset + count*width].reshape(count, width))
+            offset += count*width
+        self.nodes, self.horizontal, self.vertical, self.pellets, self.tiles = tables
+
+    def compile(self, data, rotdata):
+        ids = {}
+        for row in range(data.shape[0]):
+            for col in range(data.shape[1]):
+                if data[row][col] in self.nodeSymbols:
+                    ids[(col, row)] = len(ids)
+        horizontal = self.connect(data, ids, lambda i, j: (j, i))
+        vertical = self.connect(data.transpose(), ids, lambda i, j: (i, j))
+        pellets, tiles = [], []
+        for row in range(data.shape[0]):
+            for col in range(data.shape[1]):
+                symbol = data[row][col]
+                if symbol in self.pelletSymbols:
+                    pellets.append((row, col, ord(symbol)))
+                if symbol.isdigit():
+                    tiles.append((row, col, int(symbol), int(rotdata[row][col])))
+                elif symbol == "=":
+                    tiles.append((row, col, -1, 0))
+        tables = [list(ids), horizontal, vertical, pellets, tiles]
+        header = [self.VERSION, data.shape[0], data.shape[1]] + [len(table) for table in tables]
+        body = [np.array(table, dtype=np.int32).reshape(len(table), width) for table, width in zip(tables, self.WIDTHS)]
+        return np.concatenate([np.array(header, dtype=np.int32)] + [table.ravel() for table in body])
+
+    def connect(self, data, ids, cell):
+        """Links between consecutive nodes of each row of data (cell maps row, col back to (col, row))."""
+        links = []
+        for i in range(data.shape[0]):
+            key = None
+            for j in range(data.shape[1]):
+                if data[i][j] in self.nodeSymbols:
+                    if key is not None:
+                        links.append((ids[key], ids[cell(i, j)]))
+                    key = cell(i, j)
+                elif data[i][j] not in self.pathSymbols:
+                    key = None
+        return links
+
+    def save(self, data, path) -> None:
+        tmppath = path[:-len(".npy")] + ".tmp.npy"
+        try:
+            np.save(tmppath, data)
+            os.replace(tmppath, path)
+        except OSError:
+            pass # A read-only cache only costs the compile next time
+
+
+class MazeFiles:
+    """Process-wide cache of the compiled mazes, by text file name ("maze1.txt").
+
+    NodeGroup, PelletGroup and MazeSprites of a level share one
+    CompiledMaze; preload() loads them all up front, e.g. before forking
+    rollout workers so the children share the mapped pages.
+    """
+    mazes = {}
+
+    @classmethod
+    def compiled(cls, textfile):
+        name = textfile[:-len(".txt")] if textfile.endswith(".txt") else textfile
+        if name not in cls.mazes:
+            cls.mazes[name] = CompiledMaze(name)
+        return cls.mazes[name]
+
+    @classmethod
+    def preload(cls) -> None:
+        for maze in MazeData().mazedict.values():
+            cls.compiled(maze().name)
+
+
 class MazeBase:
     def __init__(self) -> None:
         self.portalPairs = {}
@@ -2,6 +2,9 @@ from constants import *
 
 
 class MainMode:
+    scatterTime = 7 # 秒，可由 rollout.py 的 settings 調整
+    chaseTime = 20
+
     def __init__(self) -> None:
         self.timer = 0
         self.scatter()
@@ -16,16 +19,18 @@ class MainMode:
 
     def scatter(self) -> None:
         self.mode = SCATTER
-        self.time = 7
+        self.time = self.scatterTime
         self.timer = 0
 
     def chase(self) -> None:
         self.mode = CHASE
-        self.time = 20
+        self.time = self.chaseTime
         self.timer = 0
 
 
 class ModeController:
+    freightTime = 7
+
     def __init__(self, entity) -> None:
         self.timer = 0
         self.time = None
@@ -51,7 +56,7 @@ class ModeController:
     def setFreightMode(self) -> None:
         if self.current in [SCATTER, CHASE]:
             self.timer = 0
-            self.time = 7
+            self.time = self.freightTime
             self.current = FREIGHT
         elif self.current is FREIGHT:
             self.timer = 0
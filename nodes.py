@@ -2,25 +2,23 @@ import numpy as np
 import pygame
 
 from constants import *
+from mazedata import MazeFiles
 from vector import Vector2
 
 
 class Node:
     def __init__(self, x, y) -> None:
+        self.id = None # 由 NodeGraph.addNode 編號
+        self.graph = None
         self.position = Vector2(x, y)
         self.neighbors = {UP:None, DOWN:None, LEFT:None, RIGHT:None, PORTAL:None}
-        self.access = {UP:[PACMAN, BLINKY, PINKY, INKY, CLYDE, FRUIT],
-                       DOWN:[PACMAN, BLINKY, PINKY, INKY, CLYDE, FRUIT],
-                       LEFT:[PACMAN, BLINKY, PINKY, INKY, CLYDE, FRUIT],
-                       RIGHT:[PACMAN, BLINKY, PINKY, INKY, CLYDE, FRUIT]}
 
+    # 通行權限存在 graph.access (每個方向一個位元遮罩)
     def denyAccess(self, direction, entity) -> None:
-        if entity.name in self.access[direction]:
-            self.access[direction].remove(entity.name)
+        self.graph.denyAccess(self.id, direction, accessMask((entity.name,)))
 
     def allowAccess(self, direction, entity) -> None:
-        if entity.name not in self.access[direction]:
-            self.access[direction].append(entity.name)
+        self.graph.allowAccess(self.id, direction, accessMask((entity.name,)))
 
     def render(self, screen) -> None:
         for n in self.neighbors:
@@ -31,6 +29,153 @@ class Node:
                 pygame.draw.circle(screen, RED, self.position.asInt(), 12)
 
 
+# NodeGraph 的方向欄位
+SLOTS = {UP:0, DOWN:1, LEFT:2, RIGHT:3, PORTAL:4}
+PORTALSLOT = 4
+
+
+def accessMask(names) -> int:
+    """Bit 1 << name for each entity kind (PACMAN, BLINKY, ..., FRUIT)."""
+    mask = 0
+    for name in names:
+        mask |= 1 << name
+    return mask
+
+
+ALLACCESS = accessMask((PACMAN, BLINKY, PINKY, INKY, CLYDE, FRUIT))
+
+
+class NodeGraph:
+    """Integer-indexed form of a NodeGroup, kept in step with it as nodes are added and linked.
+
+    Node i is nodes[i]. links[i][k] is the id of its neighbour in direction
+    COMPASS[k] (-1 when there is none) and lengths[i][k] the squared length
+    of that edge; exits[i] lists the (direction, slot) pairs, in COMPASS
+    order, that have a neighbour. distances[i][k] and units[i][k] are the
+    pixel length and unit vector (dx, dy) of the same edge, so entities
+    move by a scalar distance along it. access[i][k] is a bitmask of the
+    entity kinds allowed to leave node i in direction COMPASS[k] (UP..RIGHT,
+    see accessMask), so a check is a single AND. tiles maps half-tile
+    coordinates to node ids, so the 11.5-offset home nodes have a cell too;
+    it is sized from the maze and grows for nodes placed past its edge.
+    Entity moves on these tables; the *Table() methods return NumPy copies
+    for batch.py.
+    """
+    COMPASS = (UP, DOWN, LEFT, RIGHT, PORTAL)
+
+    def __init__(self, rows=NROWS, cols=NCOLS) -> None:
+        self.nodes = []
+        self.positions = []
+        self.links = []
+        self.lengths = []
+        self.distances = []
+        self.units = []
+        self.exits = []
+        self.access = []
+        self.watchers = [] # accessChanged(node, slot, old, new) 會在遮罩改變時被呼叫
+        self.routes = {} # paths.Routes，依實體種類
+        self.tiles = np.full((2*rows, 2*cols), -1, dtype=np.int32)
+
+    def addNode(self, node):
+        node.id = len(self.nodes)
+        node.graph = self
+        self.nodes.append(node)
+        self.positions.append(node.position)
+        self.links.append([-1] * len(self.COMPASS))
+        self.lengths.append([0.0] * len(self.COMPASS))
+        self.distances.append([0.0] * len(self.COMPASS))
+        self.units.append([(0.0, 0.0)] * len(self.COMPASS))
+        self.exits.append([])
+        self.access.append([ALLACCESS] * PORTALSLOT)
+        row, col = self.cell(node.position.x / TILEWIDTH, node.position.y / TILEHEIGHT)
+        if row < 0 or col < 0:
+            raise ValueError(f"node at {node.position} lies outside the maze")
+        if row >= self.tiles.shape[0] or col >= self.tiles.shape[1]: # 節點在迷宮外 (例如自訂的家)，把表放大
+            grown = np.full((max(row+1, self.tiles.shape[0]), max(col+1, self.tiles.shape[1])), -1, dtype=np.int32)
+            grown[:self.tiles.shape[0], :self.tiles.shape[1]] = self.tiles
+            self.tiles = grown
+        self.tiles[row, col] = node.id
+        return node
+
+    def cell(self, col, row):
+        return int(2 * row), int(2 * col)
+
+    def link(self, node, direction, other) -> None:
+        """Make other the neighbour of node in direction (one way)."""
+        node.neighbors[direction] = other
+        slot = SLOTS[direction]
+        self.links[node.id][slot] = other.id
+        self.lengths[node.id][slot] = (other.position - node.position).magnitudeSquared()
+        self.distances[node.id][slot], self.units[node.id][slot] = self.measure(node.id, other.id)
+        self.exits[node.id] = [(d, k) for k, d in enumerate(self.COMPASS[:PORTALSLOT]) if self.links[node.id][k] >= 0]
+        for watcher in self.watchers:
+            watcher.linksChanged()
+
+    def denyAccess(self, node, direction, mask) -> None:
+        slot = SLOTS[direction]
+        self.setAccess(node, slot, self.access[node][slot] & ~mask)
+
+    def allowAccess(self, node, direction, mask) -> None:
+        slot = SLOTS[direction]
+        self.setAccess(node, slot, self.access[node][slot] | mask)
+
+    def setAccess(self, node, slot, mask) -> None:
+        old = self.access[node][slot]
+        if mask != old:
+            self.access[node][slot] = mask
+            for watcher in self.watchers:
+                watcher.accessChanged(node, slot, old, mask)
+
+    def saveAccess(self) -> list:
+        """Copy of the access masks, for restoreAccess() (snapshots, replays)."""
+        return [row[:] for row in self.access]
+
+    def restoreAccess(self, saved) -> None:
+        for node, savedRow in enumerate(saved):
+            for slot, mask in enumerate(savedRow):
+                self.setAccess(node, slot, mask)
+
+    def nodeAt(self, col, row) -> int:
+        """Id of the node on tile (col, row) (halves allowed), -1 when there is none."""
+        if (2 * col) % 1 or (2 * row) % 1:
+            return -1
+        r, c = self.cell(col, row)
+        if 0 <= r < self.tiles.shape[0] and 0 <= c < self.tiles.shape[1]:
+            return int(self.tiles[r, c])
+        return -1
+
+    def measure(self, node, other) -> tuple:
+        vec = self.positions[other] - self.positions[node]
+        distance = vec.magnitude()
+        if distance == 0:
+            return 0.0, (0.0, 0.0)
+        return distance, (vec.x / distance, vec.y / distance)
+
+    def edge(self, node, other) -> tuple:
+        """(pixel length, unit vector) from node to other, from the edge tables when they are linked."""
+        if node == other:
+            return 0.0, (0.0, 0.0)
+        links = self.links[node]
+        if other in links:
+            slot = links.index(other)
+            return self.distances[node][slot], self.units[node][slot]
+        return self.measure(node, other)
+
+    def positionTable(self):
+        return np.array([position.asTuple() for position in self.positions], dtype=float)
+
+    def neighborTable(self):
+        return np.array(self.links, dtype=np.int32).reshape(-1, len(self.COMPASS))
+
+    def lengthTable(self):
+        return np.array(self.lengths, dtype=float).reshape(-1, len(self.COMPASS))
+
+    def accessTable(self, names):
+        """access[i, k, e]: may names[e] leave node i in direction COMPASS[k] (UP..RIGHT)."""
+        masks = np.array(self.access, dtype=np.int64).reshape(-1, PORTALSLOT, 1)
+        return (masks >> np.array(names) & 1).astype(bool)
+
+
 class NodeGroup:
     def __init__(self, level) -> None:
         self.level = level
@@ -39,21 +184,31 @@ class NodeGroup:
         #修改地方
         self.nodeSymbols = ["+", "P", "n", "T", "t", "I", "i", "S", "s", "M", "m"]
         self.pathSymbols = [".", "-", "|", "p"]
-        data = self.readMazeFile(level)
-        self.createNodeTable(data)
-        self.connectHorizontally(data)
-        self.connectVertically(data)
+        maze = MazeFiles.compiled(level)
+        self.graph = NodeGraph(maze.rows, maze.cols)
+        self.loadCompiled(maze)
         self.homekey = None
 
-    def readMazeFile(self, textfile):
-        return np.loadtxt(textfile, dtype="<U1")
+    def loadCompiled(self, maze) -> None:
+        """The same nodes and links createNodeTable and connect* build, from CompiledMaze tables."""
+        nodes = []
+        for col, row in maze.nodes.tolist():
+            x, y = self.constructKey(col, row)
+            nodes.append(self.graph.addNode(Node(x, y)))
+            self.nodesLUT[(x, y)] = nodes[-1]
+        for a, b in maze.horizontal.tolist():
+            self.graph.link(nodes[a], RIGHT, nodes[b])
+            self.graph.link(nodes[b], LEFT, nodes[a])
+        for a, b in maze.vertical.tolist():
+            self.graph.link(nodes[a], DOWN, nodes[b])
+            self.graph.link(nodes[b], UP, nodes[a])
 
     def createNodeTable(self, data, xoffset=0, yoffset=0) -> None:
         for row in list(range(data.shape[0])):
             for col in list(range(data.shape[1])):
                 if data[row][col] in self.nodeSymbols:
                     x, y = self.constructKey(col+xoffset, row+yoffset)
-                    self.nodesLUT[(x, y)] = Node(x, y)
+                    self.nodesLUT[(x, y)] = self.graph.addNode(Node(x, y))
 
     def constructKey(self, x, y):
         return x * TILEWIDTH, y * TILEHEIGHT
@@ -68,8 +223,8 @@ class NodeGroup:
                         key = self.constructKey(col+xoffset, row+yoffset)
                     else:
                         otherkey = self.constructKey(col+xoffset, row+yoffset)
-                        self.nodesLUT[key].neighbors[RIGHT] = self.nodesLUT[otherkey]
-                        self.nodesLUT[otherkey].neighbors[LEFT] = self.nodesLUT[key]
+                        self.graph.link(self.nodesLUT[key], RIGHT, self.nodesLUT[otherkey])
+                        self.graph.link(self.nodesLUT[otherkey], LEFT, self.nodesLUT[key])
                         key = otherkey
                 elif data[row][col] not in self.pathSymbols:
                     key = None
@@ -84,8 +239,8 @@ class NodeGroup:
                         key = self.constructKey(col+xoffset, row+yoffset)
                     else:
                         otherkey = self.constructKey(col+xoffset, row+yoffset)
-                        self.nodesLUT[key].neighbors[DOWN] = self.nodesLUT[otherkey]
-                        self.nodesLUT[otherkey].neighbors[UP] = self.nodesLUT[key]
+                        self.graph.link(self.nodesLUT[key], DOWN, self.nodesLUT[otherkey])
+                        self.graph.link(self.nodesLUT[otherkey], UP, self.nodesLUT[key])
                         key = otherkey
                 elif dataT[col][row] not in self.pathSymbols:
                     key = None
@@ -99,8 +254,8 @@ class NodeGroup:
         key1 = self.constructKey(*pair1)
         key2 = self.constructKey(*pair2)
         if key1 in self.nodesLUT and key2 in self.nodesLUT:
-            self.nodesLUT[key1].neighbors[PORTAL] = self.nodesLUT[key2]
-            self.nodesLUT[key2].neighbors[PORTAL] = self.nodesLUT[key1]
+            self.graph.link(self.nodesLUT[key1], PORTAL, self.nodesLUT[key2])
+            self.graph.link(self.nodesLUT[key2], PORTAL, self.nodesLUT[key1])
 
     def createHomeNodes(self, xoffset, yoffset):
         homedata = np.array([["X","X","+","X","X"],
@@ -117,18 +272,16 @@ class NodeGroup:
 
     def connectHomeNodes(self, homekey, otherkey, direction) -> None:
         key = self.constructKey(*otherkey)
-        self.nodesLUT[homekey].neighbors[direction] = self.nodesLUT[key]
-        self.nodesLUT[key].neighbors[direction*-1] = self.nodesLUT[homekey]
+        self.graph.link(self.nodesLUT[homekey], direction, self.nodesLUT[key])
+        self.graph.link(self.nodesLUT[key], direction*-1, self.nodesLUT[homekey])
 
     def getNodeFromPixels(self, xpixel, ypixel):
-        if (xpixel, ypixel) in self.nodesLUT:
-            return self.nodesLUT[(xpixel, ypixel)]
-        return None
+        return self.getNodeFromTiles(xpixel / TILEWIDTH, ypixel / TILEHEIGHT)
 
     def getNodeFromTiles(self, col, row):
-        x, y = self.constructKey(col, row)
-        if (x, y) in self.nodesLUT:
-            return self.nodesLUT[(x, y)]
+        i = self.graph.nodeAt(col, row)
+        if i >= 0:
+            return self.graph.nodes[i]
         return None
 
     def denyAccess(self, col, row, direction, entity) -> None:
@@ -142,12 +295,14 @@ class NodeGroup:
             node.allowAccess(direction, entity)
 
     def denyAccessList(self, col, row, direction, entities) -> None:
-        for entity in entities:
-            self.denyAccess(col, row, direction, entity)
+        node = self.getNodeFromTiles(col, row)
+        if node is not None:
+            self.graph.denyAccess(node.id, direction, accessMask(entity.name for entity in entities))
 
     def allowAccessList(self, col, row, direction, entities) -> None:
-        for entity in entities:
-            self.allowAccess(col, row, direction, entity)
+        node = self.getNodeFromTiles(col, row)
+        if node is not None:
+            self.graph.allowAccess(node.id, direction, accessMask(entity.name for entity in entities))
 
     def denyHomeAccess(self, entity) -> None:
         self.nodesLUT[self.homekey].denyAccess(DOWN, entity)
@@ -156,12 +311,10 @@ class NodeGroup:
         self.nodesLUT[self.homekey].allowAccess(DOWN, entity)
 
     def denyHomeAccessList(self, entities) -> None:
-        for entity in entities:
-            self.denyHomeAccess(entity)
+        self.graph.denyAccess(self.nodesLUT[self.homekey].id, DOWN, accessMask(entity.name for entity in entities))
 
     def allowHomeAccessList(self, entities) -> None:
-        for entity in entities:
-            self.allowHomeAccess(entity)
+        self.graph.allowAccess(self.nodesLUT[self.homekey].id, DOWN, accessMask(entity.name for entity in entities))
 
     def render(self, screen) -> None:
         for node in self.nodesLUT.values():
@@ -1,34 +1,29 @@
-import random
-import time
-
-import pygame
-from pygame.locals import *
-
-from bullet import Bullet
+from bullet import BulletPool
 from constants import *
+from controls import KeyboardControl
 from entity import Entity
 
 #修改地方
-from nodes import NodeGroup  # For type hinting
-from sprites import PacmanGunSprites, PacmanShieldSprites, PacmanSprites
+from nodes import PORTALSLOT, NodeGroup
+from sprites import PacmanGunSprites, PacmanShieldSprites, PacmanSprites, SpriteAtlas, entitySprites
+from text import GlyphAtlas
 
 
 class Pacman(Entity):
-    def __init__(self, node) -> None:
-        Entity.__init__(self, node )
+    def __init__(self, node, headless=False, rng=None) -> None:
+        Entity.__init__(self, node, headless, rng)
         self.name = PACMAN
         self.color = YELLOW
         self.direction = LEFT
         self.setBetweenNodes(LEFT)
         self.alive = True
-        self.sprites = PacmanSprites(self)
+        self.control = KeyboardControl() # 可替換成 ScriptedControl / RandomControl 等
+        self.sprites = entitySprites(PacmanSprites, self)
         #修改地方
         # Invisibility state
         self.is_invisible: bool = False
         self.invisibility_timer: float = 0.0
         self.invisibility_duration: float = 5.0 # Default duration, can be set by pellet
-        self.default_alpha: int = 255
-        self.invisible_alpha: int = 128 # Alpha value for semi-transparency
         # Speed boost state
         self.base_speed_value: float = self.speed # Capture the initial calculated speed
         self.is_boosted: bool = False
@@ -45,8 +40,6 @@ class Pacman(Entity):
         # Reset invisibility state
         self.is_invisible = False
         self.invisibility_timer = 0.0
-        if self.image: # Ensure image is not None before setting alpha
-            self.image.set_alpha(self.default_alpha)
         # Reset speed boost state
         self.base_speed_value = self.speed # Re-capture base speed after Entity's reset
         self.is_boosted = False
@@ -59,8 +52,6 @@ class Pacman(Entity):
         # Reset invisibility state
         self.is_invisible = False # Should not be invisible when dead
         self.invisibility_timer = 0.0
-        if self.image: # Ensure image is not None before setting alpha
-            self.image.set_alpha(self.default_alpha)
         # Reset speed boost state (speed will be whatever it was, but boost effect ends)
         if self.is_boosted:
             self.speed = self.base_speed_value # Revert to base if was boosted
@@ -68,37 +59,33 @@ class Pacman(Entity):
         self.speed_boost_timer = 0.0
 
     def update(self, dt) -> None:
+        #修改地方
+        # Invisibility logic (before the sprite update, which picks the translucent frames while invisible)
+        if self.is_invisible:
+            self.invisibility_timer -= dt
+            if self.invisibility_timer <= 0:
+                self.is_invisible = False
+                self.invisibility_timer = 0.0
         self.sprites.update(dt)
-        self.position += self.directions[self.direction]*self.speed*dt
+        self.move(dt)
         direction = self.getValidKey()
         if self.overshotTarget():
-            self.node = self.target
-            if self.node.neighbors[PORTAL] is not None:
-                self.node = self.node.neighbors[PORTAL]
-            self.target = self.getNewTarget(direction)
-            if self.target is not self.node:
+            self.nodeId = self.targetId
+            portal = self.graph.links[self.nodeId][PORTALSLOT]
+            if portal >= 0:
+                self.nodeId = portal
+            target = self.getNewTarget(direction)
+            if target != self.nodeId:
                 self.direction = direction
             else:
-                self.target = self.getNewTarget(self.direction)
+                target = self.getNewTarget(self.direction)
+            self.setTarget(target)
 
-            if self.target is self.node:
+            if target == self.nodeId:
                 self.direction = STOP
             self.setPosition()
         elif self.oppositeDirection(direction):
             self.reverseDirection()
-        #修改地方
-        # Invisibility logic
-        if self.is_invisible:
-            self.invisibility_timer -= dt
-            if self.invisibility_timer <= 0:
-                self.is_invisible = False
-                self.invisibility_timer = 0.0
-                if self.image: # Ensure image is not None
-                    self.image.set_alpha(self.default_alpha)
-            elif self.image: # Ensure image is not None
-                self.image.set_alpha(self.invisible_alpha)
-        elif self.image and self.image.get_alpha() != self.default_alpha:
-             self.image.set_alpha(self.default_alpha)
         # Speed boost logic
         if self.is_boosted:
             self.speed_boost_timer -= dt
@@ -109,22 +96,10 @@ class Pacman(Entity):
                 # print(f"Pacman speed boost ended. Speed reverted to {self.base_speed_value}")
 
     def getValidKey(self):
-        key_pressed = pygame.key.get_pressed()
-        if key_pressed[K_UP]:
-            return UP
-        if key_pressed[K_DOWN]:
-            return DOWN
-        if key_pressed[K_LEFT]:
-            return LEFT
-        if key_pressed[K_RIGHT]:
-            return RIGHT
-        return STOP
-
-    def eatPellets(self, pelletList):
-        for pellet in pelletList:
-            if self.collideCheck(pellet):
-                return pellet
-        return None
+        return self.control.getDirection(self)
+
+    def eatPellets(self, pellets):
+        return pellets.collide(self.position, self.collideRadius)
 
     def collideGhost(self, ghost):
         #修改地方
@@ -145,7 +120,7 @@ class Pacman(Entity):
             home_nodes = set(node_group.getHomeNodes())
             possible_nodes = [n for pos, n in node_group.nodesLUT.items() if pos not in home_nodes]
             if possible_nodes:
-                new_node = random.choice(possible_nodes)
+                new_node = self.random.choice(possible_nodes)
                 self.node = new_node
                 self.target = new_node
                 self.setPosition()
@@ -155,8 +130,6 @@ class Pacman(Entity):
         self.is_invisible = True
         self.invisibility_timer = duration
         self.invisibility_duration = duration # Store it if needed elsewhere
-        if self.image: # Ensure image is not None
-            self.image.set_alpha(self.invisible_alpha)
 
     def activate_speed_boost(self, factor: float, duration: float) -> None:
         """Activates Pacman's speed boost for a given duration."""
@@ -167,11 +140,11 @@ class Pacman(Entity):
 
 
 class PacmanGun(Pacman):
-    def __init__(self, node) -> None:
-        super().__init__(node)
+    def __init__(self, node, headless=False, rng=None) -> None:
+        super().__init__(node, headless, rng)
         self.name = PACMAN
         self.color = (255, 255, 255)
-        self.sprites = PacmanGunSprites(self)
+        self.sprites = entitySprites(PacmanGunSprites, self)
         self.character_type = "gun"
         self.ability = GunAbility(self)
 
@@ -179,9 +152,21 @@ class PacmanGun(Pacman):
         super().update(dt)
         self.ability.update(dt)
 
-    def render(self, screen) -> None:
-        super().render(screen)
-        self.ability.render(screen)
+def abilityHudItems(ability, digits) -> dict:
+    """HUD of an ability: its icon, plus the seconds left while cooling down.
+
+    The countdown label comes from the shared glyph atlas, so it is only
+    composed the first time each value is shown.
+    """
+    # 圖示位置
+    x = SCREENWIDTH // 2 - 24
+    y = 10
+    items = {("ability", "icon"): (ability.icon, (x, y))}
+    if ability.state == "cooldown":
+        cd = int(ability.cooldown - ability.timer) + 1
+        items["ability", "countdown"] = (digits.render(str(cd)), (x + 54, y + 8))
+    return items
+
 
 #射擊子彈技能
 class GunAbility:
@@ -193,10 +178,11 @@ class GunAbility:
         self.timer = 0.0
         self.cooldown = 10.0
         self.duration = 5.0
-        self.bullets: list[Bullet] = []
-        self.icon = pygame.image.load("ability_gun.png").convert_alpha()
-        self.icon = pygame.transform.scale(self.icon, (48, 48))
-        self.last_shot_time = 0.0
+        self.bullets = BulletPool(headless=pacman.headless)
+        self.icon = None if pacman.headless else SpriteAtlas.getImage("ability_gun.png", (48, 48))
+        self.digitColor = RED
+        self.clock = 0.0 # 遊戲時間，射速限制不依賴真實時間
+        self.last_shot_time = None
 
     def activate(self) -> None:
         if self.state == "ready":
@@ -204,6 +190,7 @@ class GunAbility:
             self.timer = 0.0
 
     def update(self, dt: float) -> None:
+        self.clock += dt
         if self.state == "active":
             self.timer += dt
             if self.timer >= self.duration:
@@ -215,40 +202,35 @@ class GunAbility:
                 self.state = "ready"
                 self.timer = 0.0
         # 更新子彈
-        for bullet in self.bullets:
-            bullet.update(dt)
-        self.bullets = [b for b in self.bullets if b.active]
+        self.bullets.update(dt)
 
     def shoot(self) -> None:
         if self.state == "active":
-            now = time.time()
             # 可加射速限制
-            if now - self.last_shot_time > 0.15:
-                bullet = Bullet(self.pacman.position.copy(), self.pacman.direction)
-                self.bullets.append(bullet)
-                self.last_shot_time = now
-
-    def render(self, screen) -> None:
-        # 畫圖示
-        x = SCREENWIDTH // 2 - 24
-        y = 10
-        screen.blit(self.icon, (x, y))
-        # 畫倒數
-        font = pygame.font.Font("PressStart2P-Regular.ttf", 18)
-        if self.state == "cooldown":
-            cd = int(self.cooldown - self.timer) + 1
-            text = font.render(str(cd), True, (255, 0, 0))
-            screen.blit(text, (x + 54, y + 8))
+            if self.last_shot_time is None or self.clock - self.last_shot_time > 0.15:
+                self.bullets.fire(self.pacman.position, self.pacman.direction)
+                self.last_shot_time = self.clock
+
+    def getHudItems(self) -> dict:
+        """Return the icon and cooldown countdown as key -> (surface, topleft)."""
+        return abilityHudItems(self, GlyphAtlas.get(18, self.digitColor))
+
+    def render(self, screen) -> list:
+        """Draw the icon, countdown and bullets; return the rects drawn."""
+        # 畫圖示與倒數
+        rects = [screen.blit(surface, topleft) for surface, topleft in self.getHudItems().values()]
+        return rects + self.renderBullets(screen)
+
+    def renderBullets(self, screen) -> list:
         # 畫子彈
-        for bullet in self.bullets:
-            bullet.render(screen)
+        return self.bullets.render(screen)
 
 class PacmanShield(Pacman):
-    def __init__(self, node) -> None:
-        super().__init__(node)
+    def __init__(self, node, headless=False, rng=None) -> None:
+        super().__init__(node, headless, rng)
         self.name = PACMAN
         self.color = (0, 255, 255)
-        self.sprites = PacmanShieldSprites(self)
+        self.sprites = entitySprites(PacmanShieldSprites, self)
         self.character_type = "shield"
         self.ability = ShieldAbility(self)
 
@@ -256,10 +238,6 @@ class PacmanShield(Pacman):
         super().update(dt)
         self.ability.update(dt)
 
-    def render(self, screen) -> None:
-        super().render(screen)
-        self.ability.render(screen)
-
 class ShieldAbility:
     """管理盾牌技能的啟動、冷卻、圖片切換、鬼魂碰撞等."""
 
@@ -269,11 +247,13 @@ class ShieldAbility:
         self.timer = 0.0
         self.cooldown = 5.0
         self.duration = 3.0
-        self.icon = pygame.image.load("ability_shield.png").convert_alpha()
-        self.icon = pygame.transform.scale(self.icon, (48, 48))
-        self.withshield_img = pygame.image.load("withshield.png").convert_alpha()
-        self.withshield_img = pygame.transform.scale(self.withshield_img, (2*TILEWIDTH, 2*TILEHEIGHT))
-        self.font = pygame.font.Font("PressStart2P-Regular.ttf", 18)
+        if pacman.headless:
+            self.icon = self.withshield_img = self.withshield_translucent = None
+        else:
+            self.icon = SpriteAtlas.getImage("ability_shield.png", (48, 48))
+            self.withshield_img = SpriteAtlas.getImage("withshield.png", (2*TILEWIDTH, 2*TILEHEIGHT))
+            self.withshield_translucent = SpriteAtlas.getTranslucent(self.withshield_img)
+        self.digitColor = (0, 191, 255)
         self.active = False
 
     def activate(self) -> None:
@@ -281,12 +261,12 @@ class ShieldAbility:
             self.state = "active"
             self.timer = 0.0
             self.active = True
-            self.pacman.image = self.withshield_img
+            self.pacman.image = self.getShieldImage()
 
     def update(self, dt: float) -> None:
         if self.state == "active":
             self.timer += dt
-            self.pacman.image = self.withshield_img
+            self.pacman.image = self.getShieldImage()
   # 持續顯示盾牌圖
             if self.timer >= self.duration:
                 self.state = "cooldown"
@@ -299,16 +279,19 @@ class ShieldAbility:
                 self.state = "ready"
                 self.timer = 0.0
 
-    def render(self, screen) -> None:
-        # 畫技能圖示
-        x = SCREENWIDTH // 2 - 24
-        y = 10
-        screen.blit(self.icon, (x, y))
-        # 畫倒數
-        if self.state == "cooldown":
-            cd = int(self.cooldown - self.timer) + 1
-            text = self.font.render(str(cd), True, (0, 191, 255))
-            screen.blit(text, (x + 54, y + 8))
+    def getShieldImage(self):
+        """Return the shield overlay, using its prebuilt translucent variant while Pacman is invisible."""
+        if self.pacman.is_invisible:
+            return self.withshield_translucent
+        return self.withshield_img
+
+    def getHudItems(self) -> dict:
+        """Return the icon and cooldown countdown as key -> (surface, topleft)."""
+        return abilityHudItems(self, GlyphAtlas.get(18, self.digitColor))
+
+    def render(self, screen) -> list:
+        """Draw the icon and countdown; return the rects drawn."""
+        return [screen.blit(surface, topleft) for surface, topleft in self.getHudItems().values()]
 
     def on_ghost_collide(self, ghost) -> None:
         # 技能啟動時，碰到鬼魂自動吃掉
@@ -0,0 +1,191 @@
+import os
+
+import numpy as np
+
+from cache import cachePath, keyDigest
+from constants import *
+from nodes import PORTALSLOT, SLOTS, NodeGraph
+
+
+class PathTable:
+    """All-pairs shortest path lengths (pixels) over a NodeGraph for one entity kind.
+
+    Edges are the links the kind may take under the graph's access masks
+    at construction time, plus zero-length portal jumps. The float32
+    [n, n] table is computed once per maze and access state (Floyd-Warshall)
+    and cached in memory and as .npy on disk; distance() and bestDirection()
+    are then plain lookups. Reversing is allowed, unlike Entity movement.
+    """
+    tables = {}
+
+    def __init__(self, graph, name) -> None:
+        self.graph = graph
+        self.name = name
+        access = [[mask >> name & 1 for mask in row] for row in graph.access] # 只看這個種類的位元
+        key = keyDigest("paths", name, TILEWIDTH, graph.links, access,
+                        [position.asTuple() for position in graph.positions])
+        self.key = key
+        if key not in PathTable.tables:
+            path = cachePath("paths", key + ".npy")
+            try:
+                table = np.load(path)
+            except (OSError, ValueError):
+                table = self.compute()
+                self.save(table, path)
+            PathTable.tables[key] = table
+        self.table = PathTable.tables[key]
+
+    def compute(self):
+        n = len(self.graph.nodes)
+        bit = 1 << self.name
+        table = np.full((n, n), np.inf)
+        np.fill_diagonal(table, 0)
+        for i in range(n):
+            links = self.graph.links[i]
+            for k in range(PORTALSLOT):
+                if links[k] >= 0 and self.graph.access[i][k] & bit:
+                    table[i, links[k]] = min(table[i, links[k]], self.graph.lengths[i][k] ** 0.5)
+            if links[PORTALSLOT] >= 0:
+                table[i, links[PORTALSLOT]] = 0
+        for k in range(n):
+            np.minimum(table, table[:, k, None] + table[k, None, :], out=table)
+        return table.astype(np.float32)
+
+    def save(self, table, path) -> None:
+        tmppath = path[:-len(".npy")] + ".tmp.npy"
+        try:
+            np.save(tmppath, table)
+            os.replace(tmppath, path)
+        except OSError:
+            pass # A read-only cache only costs the computation next time
+
+    def distance(self, node, other) -> float:
+        """Path length between two node ids (inf when other cannot be reached)."""
+        return float(self.table[node, other])
+
+    def bestDirection(self, node, other):
+        """First direction (UP/DOWN/LEFT/RIGHT) of a shortest path from node to other; STOP when none.
+
+        Ties go to the earlier direction in UP, DOWN, LEFT, RIGHT order, like goalDirection.
+        """
+        if node == other or self.table[node, other] == np.inf:
+            return STOP
+        bit = 1 << self.name
+        links = self.graph.links[node]
+        best, bestDirection = np.inf, STOP
+        for k, direction in enumerate(NodeGraph.COMPASS[:PORTALSLOT]):
+            if links[k] >= 0 and self.graph.access[node][k] & bit:
+                length = self.graph.lengths[node][k] ** 0.5 + self.table[links[k], other]
+                if length < best:
+                    best, bestDirection = length, direction
+        return bestDirection
+
+
+class Routes:
+    """Next-hop table over a live NodeGraph for one entity kind, kept current as access changes.
+
+    nextHop[a, b] is the slot (0-3: UP, DOWN, LEFT, RIGHT) of the first link
+    on a shortest path from node a to node b, -1 when there is none. The
+    graph's links and lengths and this kind's access are held as arrays and
+    patched as masks change. Opening a link relaxes the distances through it
+    in O(n^2); closing one recomputes only the rows whose shortest paths
+    used it, relaxing them over their neighbours while the other rows stay
+    exact. Either way only the next hops that can have changed are rebuilt.
+    The table comes from PathTable on the first query and again only after
+    links are added.
+    """
+
+    def __init__(self, graph, name) -> None:
+        self.graph = graph
+        self.name = name
+        self.bit = 1 << name
+        self.stale = True
+        graph.watchers.append(self)
+
+    @classmethod
+    def get(cls, graph, name):
+        if name not in graph.routes:
+            graph.routes[name] = cls(graph, name)
+        return graph.routes[name]
+
+    def linksChanged(self) -> None:
+        self.stale = True
+
+    def accessChanged(self, node, slot, old, new) -> None:
+        if self.stale or not (old ^ new) & self.bit or slot == PORTALSLOT:
+            return
+        other = self.links[node, slot]
+        if other < 0:
+            return
+        self.allowed[node, slot] = bool(new & self.bit)
+        dist = self.dist
+        through = dist[:, node, None] + self.lengths[node, slot] + dist[None, other, :]
+        everything = np.arange(len(dist))
+        if new & self.bit:
+            columns = np.flatnonzero((through < dist).any(axis=0))
+            np.minimum(dist, through, out=dist)
+        else:
+            used = (through <= dist) & np.isfinite(through) # 最短路經過這條邊的 (起點, 終點)
+            rows = np.flatnonzero(used.any(axis=1))
+            before = dist[rows]
+            dist[rows] = np.where(used[rows], np.inf, before)
+            self.relax(rows)
+            columns = np.flatnonzero((dist[rows] != before).any(axis=0))
+        self.buildNextHop(everything, columns)
+        self.buildNextHop(np.array([node]), everything) # 這個節點的出口變了，每一欄的選擇都可能不同
+
+    def relax(self, rows) -> None:
+        """Bring dist[rows] (exact or too long) down to the shortest paths, using the exact other rows."""
+        links = np.where(self.links[rows] >= 0, self.links[rows], 0)
+        lengths = np.where(self.allowed[rows], self.lengths[rows], np.inf)
+        while rows.size:
+            candidates = (lengths[:, :, None] + self.dist[links]).min(axis=1)
+            shorter = candidates < self.dist[rows]
+            if not shorter.any():
+                break
+            self.dist[rows] = np.minimum(self.dist[rows], candidates)
+
+    def update(self) -> None:
+        if self.stale:
+            graph = self.graph
+            self.links = graph.neighborTable()
+            self.lengths = np.sqrt(graph.lengthTable())
+            self.lengths[:, PORTALSLOT] = 0 # 傳送門不算距離
+            access = np.array(graph.access, dtype=np.int64) & self.bit != 0
+            self.allowed = np.hstack([access, np.ones((len(access), 1), dtype=bool)]) & (self.links >= 0)
+            self.dist = PathTable(graph, self.name).table.astype(np.float64)
+            self.nextHop = np.full(self.dist.shape, -1, dtype=np.int8)
+            everything = np.arange(len(self.dist))
+            self.buildNextHop(everything, everything)
+            self.stale = False
+
+    def buildNextHop(self, rows, columns) -> None:
+        links = self.links[rows, :PORTALSLOT]
+        lengths = self.lengths[rows, :PORTALSLOT]
+        allowed = self.allowed[rows, :PORTALSLOT]
+        # [rows, 4, columns]: 走某個出口再沿最短路到目標的長度
+        candidates = np.where(allowed[:, :, None], lengths[:, :, None] + self.dist[links][:, :, columns], np.inf)
+        best = candidates.argmin(axis=1)
+        best[np.isinf(candidates.min(axis=1))] = -1
+        best[rows[:, None] == columns[None, :]] = -1
+        self.nextHop[np.ix_(rows, columns)] = best
+
+    def direction(self, node, other):
+        """First direction of a shortest path from node to other; STOP when none."""
+        self.update()
+        slot = self.nextHop[node, other]
+        return NodeGraph.COMPASS[slot] if slot >= 0 else STOP
+
+    def firstStep(self, node, other, directions):
+        """The shortest way to other that starts with one of directions; None when none of them leads there."""
+        direction = self.direction(node, other)
+        if direction in directions:
+            return direction
+        best, bestDirection = np.inf, None
+        for direction in directions:
+            k = SLOTS.get(direction, PORTALSLOT)
+            if k < PORTALSLOT and self.allowed[node, k]:
+                length = self.lengths[node, k] + self.dist[self.links[node, k], other]
+                if length < best:
+                    best, bestDirection = length, direction
+        return bestDirection
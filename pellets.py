@@ -2,6 +2,7 @@ import numpy as np
 import pygame
 
 from constants import *
+from mazedata import MazeFiles
 from vector import Vector2
 
 
@@ -9,20 +10,31 @@ class Pellet:
     def __init__(self, row, column) -> None:
         self.name = PELLET
         self.position = Vector2(column*TILEWIDTH, row*TILEHEIGHT)
+        self.tile = (row, column)
+        self.index = None # 在 PelletGroup 陣列 (positions, kinds, alive) 中的編號，不會變
+        self.slot = None # 在 PelletGroup.pelletList 中的位置
         self.color = WHITE
         self.radius = int(2 * TILEWIDTH / 16)
         self.collideRadius = 2 * TILEWIDTH / 16
         self.points = 10
         self.visible = True
+        self.rect = None
+
+    def getRect(self):
+        """Return the screen rect the pellet is drawn in."""
+        if self.rect is None:
+            x, y = (self.position + Vector2(TILEWIDTH, TILEHEIGHT) / 2).asInt()
+            self.rect = pygame.Rect(x - self.radius, y - self.radius, 2*self.radius + 1, 2*self.radius + 1)
+        return self.rect
 
     def render(self, screen) -> None:
         if self.visible:
-            adjust = Vector2(TILEWIDTH, TILEHEIGHT) / 2
-            p = self.position + adjust
-            pygame.draw.circle(screen, self.color, p.asInt(), self.radius)
+            pygame.draw.circle(screen, self.color, self.getRect().center, self.radius)
 
 
 class PowerPellet(Pellet):
+    images = {}
+
     def __init__(self, row, column) -> None:
         Pellet.__init__(self, row, column)
         self.name = POWERPELLET
@@ -37,6 +49,22 @@ class PowerPellet(Pellet):
             self.visible = not self.visible
             self.timer = 0
 
+    def getImage(self):
+        """Return the shared pre-drawn power pellet sprite for this radius and colour."""
+        key = (self.radius, self.color)
+        if key not in PowerPellet.images:
+            size = 2*self.radius + 1
+            image = pygame.Surface((size, size))
+            image.set_colorkey(BLACK)
+            pygame.draw.circle(image, self.color, (self.radius, self.radius), self.radius)
+            PowerPellet.images[key] = image
+        return PowerPellet.images[key]
+
+    def render(self, screen):
+        if self.visible:
+            return screen.blit(self.getImage(), self.getRect())
+        return None
+
 #修改地方
 class TeleportPellet(Pellet):
     def __init__(self, row: int, column: int) -> None:
@@ -73,46 +101,151 @@ class ScoreMagnetPellet(Pellet):
         self.radius = int(8 * TILEWIDTH / 16)  # Enlarged for visibility
 
 class PelletGroup:
+    """The pellets of a level.
+
+    pelletList holds the remaining pellets in no particular order once
+    eating starts (removal swaps the last one into the gap); grid[row][col]
+    is the pellet on each tile or None, so collide() only looks at the
+    tiles around a position, however large the maze. positions, kinds,
+    points and alive hold every pellet of the level as NumPy arrays (by
+    Pellet.index) for area queries such as within().
+    """
+
     def __init__(self, pelletfile) -> None:
         self.pelletList = []
         self.powerpellets = []
+        maze = MazeFiles.compiled(pelletfile)
+        self.grid = [[None] * maze.cols for row in range(maze.rows)]
+        self.reach = 0 # 最大的 collideRadius
+        self.indexed = [] # 所有豆子，依 Pellet.index
         self.createPelletList(pelletfile)
+        positions = np.array([pellet.position.asTuple() for pellet in self.indexed], dtype=float).reshape(-1, 2)
+        self.positions = np.asfortranarray(positions) # x 欄與 y 欄各自連續
+        self.kinds = np.array([pellet.name for pellet in self.indexed], dtype=np.int32)
+        self.points = np.array([pellet.points for pellet in self.indexed], dtype=np.int64)
+        self.alive = np.ones(len(self.indexed), dtype=bool)
         self.numEaten = 0
+        self.background = None
+        self.layer = None
+        self.erased = []
 
     def update(self, dt) -> None:
         for powerpellet in self.powerpellets:
             powerpellet.update(dt)
 
     def createPelletList(self, pelletfile) -> None:
-        data = self.readPelletfile(pelletfile)
-        for row in range(data.shape[0]):
-            for col in range(data.shape[1]):
-                if data[row][col] in [".", "+"]:
-                    self.pelletList.append(Pellet(row, col))
-                elif data[row][col] in ["P", "p"]:
-                    pp = PowerPellet(row, col)
-                    self.pelletList.append(pp)
-                    self.powerpellets.append(pp)
-                #修改地方
-                elif data[row][col] == "T":
-                    tp = TeleportPellet(row, col)
-                    self.pelletList.append(tp)
-                elif data[row][col] == "I":
-                    ip = InvisibilityPellet(row, col)
-                    self.pelletList.append(ip)
-                elif data[row][col] == "S":
-                    sp = SpeedBoostPellet(row, col)
-                    self.pelletList.append(sp)
-                elif data[row][col] == "M":
-                    mp = ScoreMagnetPellet(row, col)
-                    self.pelletList.append(mp)
-
-    def readPelletfile(self, textfile):
-        return np.loadtxt(textfile, dtype="<U1")
+        for row, col, symbol in MazeFiles.compiled(pelletfile).pellets.tolist():
+            symbol = chr(symbol)
+            if symbol in [".", "+"]:
+                self.addPellet(Pellet(row, col))
+            elif symbol in ["P", "p"]:
+                pp = PowerPellet(row, col)
+                self.addPellet(pp)
+                self.powerpellets.append(pp)
+            #修改地方
+            elif symbol == "T":
+                tp = TeleportPellet(row, col)
+                self.addPellet(tp)
+            elif symbol == "I":
+                ip = InvisibilityPellet(row, col)
+                self.addPellet(ip)
+            elif symbol == "S":
+                sp = SpeedBoostPellet(row, col)
+                self.addPellet(sp)
+            elif symbol == "M":
+                mp = ScoreMagnetPellet(row, col)
+                self.addPellet(mp)
+
+    def addPellet(self, pellet) -> None:
+        row, col = pellet.tile
+        pellet.index = len(self.indexed)
+        pellet.slot = len(self.pelletList)
+        self.indexed.append(pellet)
+        self.pelletList.append(pellet)
+        self.grid[row][col] = pellet
+        self.reach = max(self.reach, pellet.collideRadius)
+
+    def contains(self, pellet) -> bool:
+        row, col = pellet.tile
+        return self.grid[row][col] is pellet
+
+    def collide(self, position, radius):
+        """The first pellet, in reading order, whose collideRadius plus radius reaches position; None if none does."""
+        x, y = position.x, position.y
+        reach = radius + self.reach
+        top, bottom = max(int((y - reach) // TILEHEIGHT), 0), min(int((y + reach) // TILEHEIGHT) + 1, len(self.grid))
+        left, right = max(int((x - reach) // TILEWIDTH), 0), min(int((x + reach) // TILEWIDTH) + 1, len(self.grid[0]))
+        for row in range(top, bottom):
+            cells = self.grid[row]
+            for col in range(left, right):
+                pellet = cells[col]
+                if pellet is not None:
+                    dx = x - pellet.position.x
+                    dy = y - pellet.position.y
+                    if dx*dx + dy*dy <= (radius + pellet.collideRadius)**2:
+                        return pellet
+        return None
+
+    def within(self, position, radius, kinds=None) -> list:
+        """The remaining pellets (of the given kinds) whose centre is within radius of position, in reading order."""
+        dx = self.positions[:, 0] - position.x
+        dy = self.positions[:, 1] - position.y
+        hit = self.alive & (dx*dx + dy*dy <= radius*radius)
+        if kinds is not None:
+            wanted = self.kinds == kinds[0]
+            for kind in kinds[1:]:
+                wanted |= self.kinds == kind
+            hit &= wanted
+        return [self.indexed[i] for i in np.flatnonzero(hit).tolist()]
 
     def isEmpty(self) -> bool:
         return len(self.pelletList) == 0
 
-    def render(self, screen) -> None:
+    def bakeLayer(self, background) -> None:
+        """Draw every pellet except the flashing power pellets onto a copy of the background once."""
+        self.background = background
+        self.layer = background.copy()
         for pellet in self.pelletList:
-            pellet.render(screen)
+            if pellet.name != POWERPELLET:
+                pellet.render(self.layer)
+        self.erased = []
+
+    def removePellet(self, pellet) -> None:
+        """Remove an eaten or absorbed pellet and erase its tile from the pellet layer."""
+        row, col = pellet.tile
+        self.grid[row][col] = None
+        self.alive[pellet.index] = False
+        last = self.pelletList.pop()
+        if last is not pellet:
+            self.pelletList[pellet.slot] = last
+            last.slot = pellet.slot
+        if pellet.name == POWERPELLET:
+            self.powerpellets.remove(pellet)
+            if self.layer is not None:
+                self.erased.append(pellet.getRect()) # 不在 layer 上，但畫面上可能還留著
+        elif self.layer is not None:
+            rect = pellet.getRect()
+            self.layer.blit(self.background, rect, rect)
+            self.erased.append(rect)
+
+    def removePellets(self, pellets) -> int:
+        """Remove several pellets at once (each in O(1)); return their total points."""
+        indexes = [pellet.index for pellet in pellets]
+        for pellet in pellets:
+            self.removePellet(pellet)
+        return int(self.points[indexes].sum())
+
+    def popErased(self) -> list:
+        """Return and forget the layer rects erased since the last call."""
+        erased = self.erased
+        self.erased = []
+        return erased
+
+    def render(self, screen) -> None:
+        """Draw the pellets that are not baked into the layer (all of them when there is no layer)."""
+        if self.layer is None:
+            for pellet in self.pelletList:
+                pellet.render(screen)
+        else:
+            for powerpellet in self.powerpellets:
+                powerpellet.render(screen)
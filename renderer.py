@@ -0,0 +1,141 @@
+import pygame
+
+from constants import *
+
+
+def addRects(rects, drawn) -> None:
+    """Append the rects returned by render calls, which may be a Rect, None or a nested list."""
+    if drawn is None:
+        return
+    if isinstance(drawn, pygame.Rect):
+        rects.append(drawn)
+    else:
+        for item in drawn:
+            addRects(rects, item)
+
+
+def blitRect(surface, topleft):
+    """The rect blit(surface, topleft) covers; blit truncates fractional positions."""
+    return pygame.Rect(topleft, surface.get_size())
+
+
+class DirtyRenderer:
+    """Renders the PLAYING state by repairing only the screen regions that changed.
+
+    Moving things (Pacman, ghosts, fruit) and overlays drawn above the HUD
+    (bullets) are redrawn every frame and the rects they
+    covered are restored from the layer (background plus baked pellets) on
+    the next frame. Eaten pellets restore the tile erased from the layer and
+    the flashing power pellets are restored and redrawn every frame.
+    Static HUD items (text, lives, captured fruit, ability icon) are only redrawn when they
+    change or when a restored or sprite rect touches them. Only the touched
+    rects are passed to pygame.display.update.
+    """
+
+    def __init__(self, screen) -> None:
+        self.screen = screen
+        self.layer = None
+        self.pellets = None
+        self.spriteRects = []
+        self.hudItems = {}
+        self.fullRedraw = True
+
+    def invalidate(self) -> None:
+        """Force the next frame to repaint and flip the whole screen."""
+        self.fullRedraw = True
+
+    def render(self, layer, pellets, sprites, hudItems, overlays=()) -> None:
+        """Draw one frame.
+
+        layer is the background or pellet layer, pellets the PelletGroup,
+        sprites the objects with a render(screen) method returning their
+        rects, hudItems a dict of key -> (surface, topleft) for the static
+        HUD and overlays callables drawing above the HUD that return rects.
+        """
+        if self.fullRedraw or layer is not self.layer or pellets is not self.pellets:
+            self.renderFull(layer, pellets, sprites, hudItems, overlays)
+            return
+
+        restore = self.spriteRects
+        restore.extend(pellets.popErased())
+        for powerpellet in pellets.powerpellets:
+            restore.append(powerpellet.getRect())
+
+        for key, (surface, topleft) in self.hudItems.items():
+            if hudItems.get(key) != (surface, topleft):
+                restore.append(blitRect(surface, topleft))
+
+        # HUD items are blended onto what lies below them, so an item is only
+        # ever redrawn onto its whole rect freshly restored from the layer.
+        pending = {key: blitRect(surface, topleft) for key, (surface, topleft) in hudItems.items()}
+        redraw = self.collectTouched(pending, restore,
+                                     [key for key, item in hudItems.items() if self.hudItems.get(key) != item])
+        for rect in restore:
+            self.screen.blit(layer, rect, rect)
+        pellets.render(self.screen)
+
+        self.spriteRects = []
+        for sprite in sprites:
+            addRects(self.spriteRects, sprite.render(self.screen))
+
+        touched = self.collectTouched(pending, list(self.spriteRects))
+        for key in touched:
+            rect = redraw[key] = touched[key]
+            self.screen.blit(layer, rect, rect)
+            self.screen.set_clip(rect)
+            pellets.render(self.screen)
+            for sprite in sprites:
+                sprite.render(self.screen)
+            self.screen.set_clip(None)
+
+        dirty = restore + self.spriteRects
+        for key, (surface, topleft) in hudItems.items():
+            if key in redraw:
+                self.screen.blit(surface, topleft)
+                dirty.append(redraw[key])
+        self.hudItems = hudItems
+
+        overlayRects = []
+        for overlay in overlays:
+            addRects(overlayRects, overlay(self.screen))
+        self.spriteRects.extend(overlayRects)
+        dirty.extend(overlayRects)
+
+        pygame.display.update(dirty)
+
+    def collectTouched(self, pending, rects, keys=()) -> dict:
+        """Move the pending HUD items listed in keys or overlapping rects into the result.
+
+        The rect of every item taken is appended to rects, so items touched
+        only through another item are taken as well.
+        """
+        taken = {}
+        for key in keys:
+            taken[key] = pending.pop(key)
+            rects.append(taken[key])
+        found = True
+        while found:
+            found = False
+            for key, rect in list(pending.items()):
+                if rect.collidelist(rects) != -1:
+                    taken[key] = pending.pop(key)
+                    rects.append(rect)
+                    found = True
+        return taken
+
+    def renderFull(self, layer, pellets, sprites, hudItems, overlays) -> None:
+        self.screen.blit(layer, (0, 0))
+        pellets.render(self.screen)
+        self.spriteRects = []
+        for sprite in sprites:
+            addRects(self.spriteRects, sprite.render(self.screen))
+        for surface, topleft in hudItems.values():
+            self.screen.blit(surface, topleft)
+        for overlay in overlays:
+            addRects(self.spriteRects, overlay(self.screen))
+        pygame.display.update()
+        self.layer = layer
+        self.pellets = pellets
+        pellets.popErased()
+        self.hudItems = hudItems
+        self.fullRedraw = False
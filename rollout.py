@@ -0,0 +1,124 @@
+"""Run many headless games across all cores and stream back per-episode results.
+
+    python rollout.py --episodes 64 --processes 8 --set MainMode.scatterTime=5
+"""
+import argparse
+import multiprocessing
+from collections import namedtuple
+
+from constants import *
+from controls import RandomControl
+from mazedata import MazeFiles
+from modes import MainMode, ModeController
+from simulation import Simulation
+
+# policy: a picklable callable seed -> control (RandomControl, a module-level class or function)
+# settings: {"MainMode.scatterTime": 5, ...} applied to TUNABLES for this episode only
+Episode = namedtuple("Episode", "seed policy character settings maxTicks",
+                     defaults=(RandomControl, 0, None, 100000))
+Result = namedtuple("Result", "seed policy score level deaths pellets ticks")
+
+TUNABLES = {"MainMode": MainMode, "ModeController": ModeController}
+
+
+def applySettings(settings) -> dict:
+    """Set class attributes named "Class.attribute"; return the values they replace."""
+    previous = {}
+    for name, value in settings.items():
+        cls, attribute = name.split(".")
+        previous[name] = getattr(TUNABLES[cls], attribute)
+        setattr(TUNABLES[cls], attribute, value)
+    return previous
+
+
+def runEpisode(episode) -> Result:
+    """Play one full game (until game over or maxTicks) without a display."""
+    previous = applySettings(episode.settings or {})
+    try:
+        sim = Simulation(episode.character, episode.policy(episode.seed), headless=True, seed=episode.seed)
+        sim.startGame()
+        dt = TICKLENGTH * TIMESCALE
+        deaths = pellets = ticks = eaten = 0
+        while ticks < episode.maxTicks:
+            if sim.pause.paused and sim.pause.func is None:
+                sim.pause.setPause(should_be_paused=False) # 等玩家按空白鍵的暫停 (Ready!) 直接開始
+            sim.step(dt)
+            ticks += 1
+            numEaten = sim.pellets.numEaten # 過關後新的 PelletGroup 從 0 開始
+            pellets += numEaten - eaten if numEaten >= eaten else numEaten
+            eaten = numEaten
+            events = [event for event, data in sim.popEvents()]
+            deaths += events.count(PACMANDIED)
+            if GAMEOVER in events:
+                break
+    finally:
+        applySettings(previous)
+    policy = getattr(episode.policy, "__name__", repr(episode.policy))
+    return Result(episode.seed, policy, sim.score, sim.level, deaths, pellets, ticks)
+
+
+def initWorker() -> None:
+    # Already done in the parent when the pool forks; needed for spawn.
+    MazeFiles.preload()
+
+
+class RolloutRunner:
+    """A pool of worker processes that play Episodes and yield Results as they finish.
+
+    The maze files are parsed once in the parent before the workers fork,
+    so every worker shares them copy-on-write. Results come back in
+    completion order; each carries its seed.
+    """
+
+    def __init__(self, processes=None, chunksize=1) -> None:
+        initWorker()
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context()
+        self.chunksize = chunksize
+        self.pool = context.Pool(processes, initializer=initWorker)
+
+    def run(self, episodes):
+        return self.pool.imap_unordered(runEpisode, episodes, self.chunksize)
+
+    def close(self) -> None:
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def episodes(seeds, policies=(RandomControl,), character=0, settings=None, maxTicks=100000):
+    """Every seed played by every policy."""
+    for policy in policies:
+        for seed in seeds:
+            yield Episode(seed, policy, character, settings, maxTicks)
+
+
+def parseSetting(text):
+    name, value = text.split("=")
+    return name, float(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play headless games in parallel and report the results.")
+    parser.add_argument("--episodes", type=int, default=32)
+    parser.add_argument("--processes", type=int, default=None, help="default: one per core")
+    parser.add_argument("--character", type=int, choices=(0, 1, 2), default=0)
+    parser.add_argument("--max-ticks", type=int, default=100000)
+    parser.add_argument("--set", type=parseSetting, action="append", default=[], metavar="CLASS.ATTR=VALUE",
+                        help="e.g. MainMode.scatterTime=5")
+    args = parser.parse_args()
+
+    total = []
+    with RolloutRunner(args.processes) as runner:
+        for result in runner.run(episodes(range(args.episodes), character=args.character,
+                                          settings=dict(args.set), maxTicks=args.max_ticks)):
+            print(result)
+            total.append(result.score)
+    print(f"{len(total)} episodes, mean score {sum(total) / len(total):.1f}")
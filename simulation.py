@@ -0,0 +1,330 @@
+import os
+import random
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from collision import BULLETGHOST, PACMANFRUIT, PACMANGHOST, CollisionStage
+from constants import *
+from fruit import Fruit
+from ghosts import GhostGroup
+from mazedata import MazeData
+from nodes import NodeGroup
+from pacman import Pacman, PacmanGun, PacmanShield
+from pauser import Pause
+from pellets import PelletGroup
+
+# startGame 需要的、只取決於關卡編號的部分 (可以在背景執行緒建好)
+PreparedLevel = namedtuple("PreparedLevel", "level maze nodes pellets")
+
+
+class Simulation:
+    """The game rules without a window, mixer or keyboard.
+
+    Runs modes, pellets, power-ups, portals, the ghost house, fruit and
+    abilities. Pacman is steered by its control (see controls.py) and
+    everything a player would see or hear is reported as (event, data)
+    pairs through popEvents(); GameController turns those into sounds
+    and text. With headless=True no image is ever loaded, so a
+    Simulation can be stepped on a machine without a display.
+
+    Each Simulation has its own random.Random (seed), used by Pacman's
+    teleport and the ghosts' random walk, so games in one process do not
+    share or disturb the global RNG.
+
+    During the pause after a level is cleared (or the game is lost) the
+    next level's maze, node graph and pellets are built on the loader
+    thread, and startGame() takes them over when the pause ends.
+    """
+    loader = None # 所有 Simulation 共用的背景執行緒
+    loaderPid = None
+
+    def __init__(self, character=0, control=None, headless=False, seed=None) -> None:
+        self.headless = headless
+        self.random = random.Random(seed)
+        self.character = character
+        self.control = control
+        self.mazedata = MazeData()
+        self.level = 0
+        self.lives = 5
+        self.score = 0
+        self.time = 0.0
+        self.fruit = None
+        self.fruitCaptured = [] # 已吃過的水果種類 (Fruit.kind)
+        self.extra_life_score_threshold: int = 10000
+        self.extra_life_awarded: bool = False
+        self.gameOver = False
+        self.pause = Pause(paused=True) # Start paused to show "Ready!" text initially
+        self.events = []
+        self.preloaded = None # Future of a PreparedLevel
+        self.collisions = CollisionStage()
+
+    def emit(self, event, data=None) -> None:
+        self.events.append((event, data))
+
+    def popEvents(self) -> list:
+        """Return and forget the events raised since the last call."""
+        events = self.events
+        self.events = []
+        return events
+
+    @classmethod
+    def levelLoader(cls):
+        if cls.loader is None or cls.loaderPid != os.getpid(): # fork 出來的行程沒有父行程的執行緒
+            cls.loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="level-loader")
+            cls.loaderPid = os.getpid()
+        return cls.loader
+
+    def loadLevel(self, level) -> PreparedLevel:
+        """Build the maze, node graph and pellets of level; uses no live game state."""
+        mazedata = MazeData()
+        mazedata.loadMaze(level)
+        maze = mazedata.obj
+        nodes = NodeGroup(maze.name+".txt")
+        maze.setPortalPairs(nodes)
+        maze.connectHomeNodes(nodes)
+        return PreparedLevel(level, maze, nodes, PelletGroup(maze.name+".txt"))
+
+    def preloadLevel(self, level) -> None:
+        self.preloaded = self.levelLoader().submit(self.loadLevel, level)
+
+    def takeLevel(self) -> PreparedLevel:
+        """The preloaded level when it is the one to start (waiting for it if needed), else a fresh load."""
+        preloaded, self.preloaded = self.preloaded, None
+        if preloaded is not None:
+            prepared = preloaded.result()
+            if prepared.level == self.level:
+                return prepared
+        return self.loadLevel(self.level)
+
+    def startGame(self) -> None:
+        prepared = self.takeLevel()
+        self.mazedata.obj = prepared.maze
+        self.nodes = prepared.nodes
+        # 根據選擇建立角色
+        start = self.nodes.getNodeFromTiles(*self.mazedata.obj.pacmanStart)
+        if self.character == 0:
+            self.pacman = Pacman(start, self.headless, self.random)
+        elif self.character == 1:
+            self.pacman = PacmanGun(start, self.headless, self.random)
+        elif self.character == 2:
+            self.pacman = PacmanShield(start, self.headless, self.random)
+        if self.control is not None:
+            self.pacman.control = self.control
+        self.pacman.game = self  # 讓pacman能取得 nodes 等遊戲狀態
+        self.pellets = prepared.pellets
+        self.ghosts = GhostGroup(self.nodes.getStartTempNode(), self.pacman, self.headless, self.random)
+        self.ghosts.pinky.setStartNode(self.nodes.getNodeFromTiles(*self.mazedata.obj.addOffset(2, 3)))
+        self.ghosts.inky.setStartNode(self.nodes.getNodeFromTiles(*self.mazedata.obj.addOffset(0, 3)))
+        self.ghosts.clyde.setStartNode(self.nodes.getNodeFromTiles(*self.mazedata.obj.addOffset(4, 3)))
+        self.ghosts.setSpawnNode(self.nodes.getNodeFromTiles(*self.mazedata.obj.addOffset(2, 3)))
+        self.ghosts.blinky.setStartNode(self.nodes.getNodeFromTiles(*self.mazedata.obj.addOffset(2, 0)))
+        self.nodes.denyHomeAccess(self.pacman)
+        self.nodes.denyHomeAccessList(self.ghosts)
+        self.ghosts.inky.startNode.denyAccess(RIGHT, self.ghosts.inky)
+        self.ghosts.clyde.startNode.denyAccess(LEFT, self.ghosts.clyde)
+        self.mazedata.obj.denyGhostsAccess(self.ghosts, self.nodes)
+        self.emit(LEVELSTART, self.level)
+
+    def step(self, dt) -> None:
+        """Advance the game by dt seconds of game time (one fixed tick)."""
+        self.time += dt
+        for entity in (self.pacman, *self.ghosts):
+            entity.prevPosition = entity.position
+        self.pellets.update(dt)
+        if not self.pause.paused:
+            self.ghosts.update(dt)
+            if self.fruit is not None:
+                self.fruit.update(dt)
+            self.checkPelletEvents()
+            self.spawnFruit()
+            contacts = self.detectCollisions()
+            self.checkGhostEvents(contacts)
+            self.checkFruitEvents(contacts)
+
+        if self.pacman.alive:
+            if not self.pause.paused:
+                self.pacman.update(dt)
+        else:
+            # This handles pacman death animation
+            self.pacman.update(dt)
+
+        afterPauseMethod = self.pause.update(dt)
+        if afterPauseMethod is not None:
+            afterPauseMethod()
+
+    def useAbility(self) -> None:
+        """The primary ability key: shoot while the gun is active, otherwise activate."""
+        if not hasattr(self.pacman, "ability"):
+            return
+        # 只有有shoot方法的才呼叫shoot，否則只呼叫activate
+        if hasattr(self.pacman.ability, "shoot") and self.pacman.ability.state == "active":
+            self.pacman.ability.shoot()
+        elif self.pacman.ability.state == "ready":
+            self.pacman.ability.activate()
+
+    def useSecondaryAbility(self) -> None:
+        if not hasattr(self.pacman, "secondary_ability"):
+            return
+        if self.pacman.secondary_ability.state == "ready":
+            self.pacman.secondary_ability.activate()
+        elif self.pacman.secondary_ability.state == "active" and hasattr(self.pacman.secondary_ability, "shoot"):
+            self.pacman.secondary_ability.shoot()
+
+    def checkPelletEvents(self) -> None:
+        pellet = self.pacman.eatPellets(self.pellets)
+        if pellet:
+            self.pellets.numEaten += 1
+            self.updateScore(pellet.points)
+            self.emit(PELLETEATEN, pellet)
+
+            if pellet.name == TELEPORTPELLET:
+                self.pacman.teleport(self.nodes)
+            elif pellet.name == POWERPELLET:
+                self.ghosts.startFreight()
+            elif pellet.name == INVISIBILITYPELLET:
+                invisibility_duration = 5.0
+                self.pacman.activate_invisibility(invisibility_duration)
+            elif pellet.name == SPEEDBOOSTPELLET:
+                boost_factor = 1.5
+                boost_duration = 8.0
+                self.pacman.activate_speed_boost(boost_factor, boost_duration)
+            elif pellet.name == SCOREMAGNETPELLET:
+                magnet_radius = TILEWIDTH * 4 # Radius of 4 tiles
+                # Absorb only normal pellets and power pellets (not the magnet itself), and only visible ones
+                absorbed = [other for other in self.pellets.within(self.pacman.position, magnet_radius, (PELLET, POWERPELLET))
+                            if other.visible]
+                if absorbed:
+                    self.pellets.numEaten += len(absorbed) # Increment for game progression logic
+                    self.updateScore(self.pellets.removePellets(absorbed))
+
+            # Standard game logic dependent on numEaten (e.g., releasing ghosts)
+            # This will now correctly account for pellets eaten by the magnet
+            if self.pellets.numEaten == 30:
+                self.ghosts.inky.startNode.allowAccess(RIGHT, self.ghosts.inky)
+            if self.pellets.numEaten == 70:
+                self.ghosts.clyde.startNode.allowAccess(LEFT, self.ghosts.clyde)
+            # Remove the originally eaten pellet (teleport, power, invisibility, speed, or magnet itself)
+            if self.pellets.contains(pellet): # It might have been absorbed if it was another magnet (unlikely setup)
+                self.pellets.removePellet(pellet)
+            if self.pellets.isEmpty():
+                self.preloadLevel(self.level + 1)
+                self.emit(LEVELCLEARED)
+                self.hideEntities()
+                self.pause.setPause(should_be_paused=True, pauseTime=3, func=self.nextLevel)
+
+    def eatGhost(self, ghost) -> None:
+        """Score a ghost, show its points and pause for a second before it heads home."""
+        self.updateScore(ghost.points)
+        self.emit(POINTSEARNED, (ghost.points, ghost.position.x, ghost.position.y))
+        self.ghosts.updatePoints()
+        self.pause.setPause(should_be_paused=True, pauseTime=1, func=self.showEntities)
+
+    def detectCollisions(self) -> list:
+        """This tick's contacts (see CollisionStage); Pacman's position is final once the pellet events ran."""
+        bullets = getattr(getattr(self.pacman, "ability", None), "bullets", None)
+        return self.collisions.detect(self.pacman, self.ghosts, self.fruit, bullets)
+
+    def checkGhostEvents(self, contacts) -> None:
+        ability = getattr(self.pacman, "ability", None)
+        # 盾牌技能碰撞（只有技能啟動時才特殊處理）
+        shield = hasattr(ability, "on_ghost_collide") and ability.state == "active"
+        for contact in contacts:
+            ghost = contact.entity
+            if contact.kind == BULLETGHOST:
+                # 子彈碰撞；同一格內先前的接觸可能已經用掉這顆子彈或讓鬼魂消失
+                bullets = ability.bullets
+                if ghost.visible and bullets.active[contact.slot] and ghost.mode.current is not SPAWN:
+                    self.emit(GHOSTEATEN, ghost) # 假設子彈擊中鬼效果類似吃鬼
+                    ghost.startFreight()  # 先進入可吃狀態
+                    ghost.visible = False
+                    self.eatGhost(ghost)
+                    ghost.startSpawn()
+                    self.nodes.allowHomeAccess(ghost)
+                    bullets.release(contact.slot)
+            elif contact.kind == PACMANGHOST and not self.pacman.is_invisible:
+                if shield:
+                    if ghost.mode.current is not SPAWN:
+                        ability.on_ghost_collide(ghost)
+                        self.eatGhost(ghost)
+                # 一般Pacman碰撞（包含PacmanShield未開技能時）
+                elif ghost.mode.current is FREIGHT:
+                    self.emit(GHOSTEATEN, ghost)
+                    self.pacman.visible = False
+                    ghost.visible = False
+                    self.eatGhost(ghost)
+                    ghost.startSpawn()
+                    self.nodes.allowHomeAccess(ghost)
+                elif ghost.mode.current is not SPAWN:
+                    if self.pacman.alive:
+                        self.lives -=  1
+                        self.pacman.die() # pacman.die() 內部可能有動畫計時器
+                        self.emit(PACMANDIED)
+                        self.ghosts.hide()
+                        if self.lives <= 0:
+                            self.gameOver = True
+                            self.preloadLevel(0)
+                            self.emit(GAMEOVER)
+                            self.pause.setPause(should_be_paused=True, pauseTime=3, func=self.restartGame)
+                        else:
+                            self.pause.setPause(should_be_paused=True, pauseTime=3, func=self.resetLevel)
+
+    def spawnFruit(self) -> None:
+        if self.pellets.numEaten in {50, 140} and self.fruit is None:
+            self.fruit = Fruit(self.nodes.getNodeFromTiles(9, 20), self.level, self.headless)
+
+    def checkFruitEvents(self, contacts) -> None:
+        if self.fruit is not None:
+            if any(contact.kind == PACMANFRUIT for contact in contacts):
+                self.updateScore(self.fruit.points)
+                self.emit(FRUITEATEN, self.fruit)
+                self.emit(POINTSEARNED, (self.fruit.points, self.fruit.position.x, self.fruit.position.y))
+                if self.fruit.kind not in self.fruitCaptured:
+                    self.fruitCaptured.append(self.fruit.kind)
+                self.fruit = None
+            elif self.fruit.destroy:
+                self.fruit = None
+
+    def showEntities(self) -> None:
+        self.pacman.visible = True
+        self.ghosts.show()
+
+    def hideEntities(self) -> None:
+        self.pacman.visible = False
+        self.ghosts.hide()
+
+    def nextLevel(self) -> None:
+        self.emit(NEXTLEVEL)
+        self.showEntities()
+        self.level += 1
+        self.pause.paused = True
+        self.startGame()
+
+    def restartGame(self) -> None:
+        self.emit(RESTART)
+        self.lives = 5
+        self.level = 0
+        self.pause.paused = True
+        self.fruit = None
+        self.startGame()
+        self.score = 0
+        self.fruitCaptured = []
+        self.extra_life_awarded = False # 重置額外生命旗標
+        self.gameOver = False
+        self.emit(READY)
+
+    def resetLevel(self) -> None:
+        self.pause.paused = True
+        self.pacman.reset()
+        self.ghosts.reset()
+        self.fruit = None
+        self.emit(READY)
+
+    def updateScore(self, points) -> None:
+        self.score += points
+        # 檢查是否達到獲得額外生命的分數門檻
+        if not self.extra_life_awarded and self.score >= self.extra_life_score_threshold:
+            self.lives += 1
+            self.emit(EXTRALIFE)
+            self.extra_life_awarded = True
+            # 如果希望在更高分數再次獎勵生命，可以擴展此邏輯
+            # 例如： self.extra_life_score_threshold += 10000 或設定多個門檻
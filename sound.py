@@ -18,6 +18,7 @@ class SoundController:
 
         self.music_dir: str = music_dir
         self.sounds: dict[str, pygame.mixer.Sound] = {}
+        self.muted: bool = False # Sound effects are skipped while muted (e.g. when fast-forwarding)
         self.load_sounds()
         self.current_background_music_name: str | None = None # Adjusted type hint
 
@@ -51,6 +52,8 @@ class SoundController:
             The Channel object if the sound was played, None otherwise.
 
         """
+        if self.muted:
+            return None
         if name in self.sounds:
             sound: pygame.mixer.Sound = self.sounds[name]
             try:
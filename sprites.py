@@ -1,122 +1,232 @@
-import numpy as np
+import os
+
 import pygame
 
 from animation import Animator
+from cache import cachePath, fileDigest, keyDigest
 from constants import *
+from mazedata import MazeFiles
 
 BASETILEWIDTH = 16
 BASETILEHEIGHT = 16
 DEATH = 5
 
+class SpriteAtlas:
+    """Process-wide cache of decoded and scaled sprite sheets.
+
+    Every sprite owner asks the atlas for its sheet instead of loading the
+    PNG itself, so each file is read, converted and scaled once per process
+    and all owners share the same Surface.
+    """
+
+    sheets = {}
+    frames = {}
+    translucent = {}
+
+    @classmethod
+    def getSheet(cls, filename="spritesheet_mspacman.png"):
+        """Return the shared tile sheet, transparent wherever it matches its top-left pixel."""
+        key = (filename, TILEWIDTH, TILEHEIGHT)
+        if key not in cls.sheets:
+            sheet = pygame.image.load(filename).convert()
+            transcolor = sheet.get_at((0,0))
+            sheet.set_colorkey(transcolor)
+            width = int(sheet.get_width() / BASETILEWIDTH * TILEWIDTH)
+            height = int(sheet.get_height() / BASETILEHEIGHT * TILEHEIGHT)
+            cls.sheets[key] = pygame.transform.scale(sheet, (width, height))
+        return cls.sheets[key]
+
+    @classmethod
+    def getImage(cls, filename, size, colorkey=None):
+        """Return a shared single-image sheet (with per-pixel alpha) scaled to size."""
+        key = (filename, size, colorkey)
+        if key not in cls.sheets:
+            image = pygame.image.load(filename).convert_alpha()
+            if colorkey is not None:
+                image.set_colorkey(colorkey)
+            cls.sheets[key] = pygame.transform.scale(image, size)
+        return cls.sheets[key]
+
+    @classmethod
+    def getTranslucent(cls, surface, alpha=INVISIBLEALPHA):
+        """Return a shared copy of surface with the given surface alpha, built on first use.
+
+        Callers switch between the opaque and translucent variants instead of
+        calling set_alpha on a shared surface every frame.
+        """
+        if surface is None:
+            return None
+        key = (id(surface), alpha)
+        if key not in cls.translucent:
+            variant = surface.copy()
+            variant.set_alpha(alpha)
+            cls.translucent[key] = (surface, variant) # Keeps surface alive so its id stays unique
+        return cls.translucent[key][1]
+
+    @classmethod
+    def getFrame(cls, x, y, width, height, filename="spritesheet_mspacman.png"):
+        """Return the shared pixel rect of a tile sheet, sliced on first use only."""
+        key = (filename, x, y, width, height)
+        if key not in cls.frames:
+            cls.frames[key] = cls.getSheet(filename).subsurface(pygame.Rect(x, y, width, height))
+        return cls.frames[key]
+
+
+def runSteps(steps):
+    """Run a step generator (see MazeSprites.buildBackground) to the end and return its result."""
+    while True:
+        try:
+            next(steps)
+        except StopIteration as done:
+            return done.value
+
+
+def entitySprites(spritesClass, entity, *args):
+    """Return spritesClass(entity, *args), or NullSprites for a headless entity."""
+    if entity.headless:
+        return NullSprites(entity)
+    return spritesClass(entity, *args)
+
+
+class NullSprites:
+    """Sprites of an entity that is never drawn: no images, no animation."""
+
+    def __init__(self, entity) -> None:
+        self.entity = entity
+
+    def update(self, dt) -> None:
+        pass
+
+    def reset(self) -> None:
+        pass
+
+    def getStartImage(self):
+        return None
+
+
 class Spritesheet:
     def __init__(self) -> None:
-        self.sheet = pygame.image.load("spritesheet_mspacman.png").convert()
-        transcolor = self.sheet.get_at((0,0))
-        self.sheet.set_colorkey(transcolor)
-        width = int(self.sheet.get_width() / BASETILEWIDTH * TILEWIDTH)
-        height = int(self.sheet.get_height() / BASETILEHEIGHT * TILEHEIGHT)
-        self.sheet = pygame.transform.scale(self.sheet, (width, height))
+        self.sheet = SpriteAtlas.getSheet()
 
     def getImage(self, x, y, width, height):
-        x *= TILEWIDTH
-        y *= TILEHEIGHT
-        self.sheet.set_clip(pygame.Rect(x, y, width, height))
-        return self.sheet.subsurface(self.sheet.get_clip())
+        return SpriteAtlas.getFrame(x*TILEWIDTH, y*TILEHEIGHT, width, height)
 
 
 class PacmanSprites(Spritesheet):
+    animationFrames = {LEFT: ((8,0), (0, 0), (0, 2), (0, 0)),
+                       RIGHT: ((10,0), (2, 0), (2, 2), (2, 0)),
+                       UP: ((10,2), (6, 0), (6, 2), (6, 0)),
+                       DOWN: ((8,2), (4, 0), (4, 2), (4, 0)),
+                       DEATH: ((0, 12), (2, 12), (4, 12), (6, 12), (8, 12), (10, 12), (12, 12), (14, 12), (16, 12), (18, 12), (20, 12))}
+    stopFrames = {LEFT: (8, 0), RIGHT: (10, 0), UP: (10, 2), DOWN: (8, 2)}
+    tables = None
+
     def __init__(self, entity) -> None:
         Spritesheet.__init__(self)
         self.entity = entity
+        self.opaque, self.translucent = self.getTables()
+        self.frames, self.stopframes = self.opaque
         self.entity.image = self.getStartImage()
         self.animations = {}
         self.defineAnimations()
-        self.stopimage = (8, 0)
+        self.stopdirection = LEFT
+
+    def getTables(self):
+        """Slice every Pacman frame once per process into tables indexed by animation frame.
+
+        Returns the opaque tables and their translucent twins used while
+        Pacman is invisible; each is a (frames, stopframes) pair.
+        """
+        if PacmanSprites.tables is None:
+            frames = {key: tuple(self.getImage(*frame) for frame in coords)
+                      for key, coords in self.animationFrames.items()}
+            stopframes = {key: frames[key][0] for key in self.stopFrames}
+            translucent = {key: tuple(SpriteAtlas.getTranslucent(frame) for frame in table)
+                           for key, table in frames.items()}
+            translucentStop = {key: translucent[key][0] for key in self.stopFrames}
+            PacmanSprites.tables = ((frames, stopframes), (translucent, translucentStop))
+        return PacmanSprites.tables
 
     def defineAnimations(self) -> None:
-        self.animations[LEFT] = Animator(((8,0), (0, 0), (0, 2), (0, 0)))
-        self.animations[RIGHT] = Animator(((10,0), (2, 0), (2, 2), (2, 0)))
-        self.animations[UP] = Animator(((10,2), (6, 0), (6, 2), (6, 0)))
-        self.animations[DOWN] = Animator(((8,2), (4, 0), (4, 2), (4, 0)))
-        self.animations[DEATH] = Animator(((0, 12), (2, 12), (4, 12), (6, 12), (8, 12), (10, 12), (12, 12), (14, 12), (16, 12), (18, 12), (20, 12)), speed=6, loop=False)
+        for key in [LEFT, RIGHT, UP, DOWN]:
+            self.animations[key] = Animator(tuple(range(len(self.frames[key]))))
+        self.animations[DEATH] = Animator(tuple(range(len(self.frames[DEATH]))), speed=6, loop=False)
 
     def update(self, dt) -> None:
         if self.entity.alive:
-            if self.entity.direction == LEFT:
-                self.entity.image = self.getImage(*self.animations[LEFT].update(dt))
-                self.stopimage = (8, 0)
-            elif self.entity.direction == RIGHT:
-                self.entity.image = self.getImage(*self.animations[RIGHT].update(dt))
-                self.stopimage = (10, 0)
-            elif self.entity.direction == DOWN:
-                self.entity.image = self.getImage(*self.animations[DOWN].update(dt))
-                self.stopimage = (8, 2)
-            elif self.entity.direction == UP:
-                self.entity.image = self.getImage(*self.animations[UP].update(dt))
-                self.stopimage = (10, 2)
-            elif self.entity.direction == STOP:
-                self.entity.image = self.getImage(*self.stopimage)
+            frames, stopframes = self.translucent if self.entity.is_invisible else self.opaque
+            direction = self.entity.direction
+            if direction == STOP:
+                self.entity.image = stopframes[self.stopdirection]
+            elif direction in stopframes:
+                self.entity.image = frames[direction][self.animations[direction].update(dt)]
+                self.stopdirection = direction
         else:
-            self.entity.image = self.getImage(*self.animations[DEATH].update(dt))
+            self.entity.image = self.frames[DEATH][self.animations[DEATH].update(dt)]
 
     def reset(self) -> None:
         for key in list(self.animations.keys()):
             self.animations[key].reset()
 
     def getStartImage(self):
-        return self.getImage(8, 0)
+        return self.stopframes[LEFT]
 
     def getImage(self, x, y):
         return Spritesheet.getImage(self, x, y, 2*TILEWIDTH, 2*TILEHEIGHT)
 
 
 class GhostSprites(Spritesheet):
+    tables = {}
+
     def __init__(self, entity) -> None:
         Spritesheet.__init__(self)
         self.x = {BLINKY:0, PINKY:2, INKY:4, CLYDE:6}
         self.entity = entity
+        self.frames = self.getTable()
         self.entity.image = self.getStartImage()
 
+    def getTable(self):
+        """Return this ghost's frames indexed by mode then direction, sliced once per process."""
+        name = self.entity.name
+        if name not in GhostSprites.tables:
+            x = self.x[name]
+            rows = {LEFT:8, RIGHT:10, DOWN:6, UP:4}
+            normal = {direction: self.getImage(x, y) for direction, y in rows.items()}
+            spawn = {direction: self.getImage(8, y) for direction, y in rows.items()}
+            freight = self.getImage(10, 4)
+            GhostSprites.tables[name] = {SCATTER: normal, CHASE: normal, SPAWN: spawn,
+                                         FREIGHT: dict.fromkeys((LEFT, RIGHT, DOWN, UP, STOP), freight)}
+        return GhostSprites.tables[name]
+
     def update(self, dt) -> None:
-        x = self.x[self.entity.name]
-        if self.entity.mode.current in [SCATTER, CHASE]:
-            if self.entity.direction == LEFT:
-                self.entity.image = self.getImage(x, 8)
-            elif self.entity.direction == RIGHT:
-                self.entity.image = self.getImage(x, 10)
-            elif self.entity.direction == DOWN:
-                self.entity.image = self.getImage(x, 6)
-            elif self.entity.direction == UP:
-                self.entity.image = self.getImage(x, 4)
-        elif self.entity.mode.current == FREIGHT:
-            self.entity.image = self.getImage(10, 4)
-        elif self.entity.mode.current == SPAWN:
-            if self.entity.direction == LEFT:
-                self.entity.image = self.getImage(8, 8)
-            elif self.entity.direction == RIGHT:
-                self.entity.image = self.getImage(8, 10)
-            elif self.entity.direction == DOWN:
-                self.entity.image = self.getImage(8, 6)
-            elif self.entity.direction == UP:
-                self.entity.image = self.getImage(8, 4)
+        image = self.frames[self.entity.mode.current].get(self.entity.direction)
+        if image is not None:
+            self.entity.image = image
 
     def getStartImage(self):
-        return self.getImage(self.x[self.entity.name], 4)
+        return self.frames[SCATTER][UP]
 
     def getImage(self, x, y):
         return Spritesheet.getImage(self, x, y, 2*TILEWIDTH, 2*TILEHEIGHT)
 
 
 class FruitSprites(Spritesheet):
+    fruits = {0:(16,8), 1:(18,8), 2:(20,8), 3:(16,10), 4:(18,10), 5:(20,10)}
+
     def __init__(self, entity, level) -> None:
         Spritesheet.__init__(self)
         self.entity = entity
-        self.fruits = {0:(16,8), 1:(18,8), 2:(20,8), 3:(16,10), 4:(18,10), 5:(20,10)}
         self.entity.image = self.getStartImage(level % len(self.fruits))
 
     def getStartImage(self, key):
         return self.getImage(*self.fruits[key])
 
+    @classmethod
+    def getFruitImage(cls, key):
+        """Return the shared image of fruit kind key (as recorded for captured fruit)."""
+        x, y = cls.fruits[key]
+        return SpriteAtlas.getFrame(x*TILEWIDTH, y*TILEHEIGHT, 2*TILEWIDTH, 2*TILEHEIGHT)
+
     def getImage(self, x, y):
         return Spritesheet.getImage(self, x, y, 2*TILEWIDTH, 2*TILEHEIGHT)
 
@@ -146,29 +256,63 @@ class LifeSprites(Spritesheet):
 
 
 class MazeSprites(Spritesheet):
+    backgrounds = {}
+
     def __init__(self, mazefile, rotfile) -> None:
         Spritesheet.__init__(self)
-        self.data = self.readMazeFile(mazefile)
-        self.rotdata = self.readMazeFile(rotfile)
+        self.mazefile = mazefile
+        self.rotfile = rotfile
 
     def getImage(self, x, y):
         return Spritesheet.getImage(self, x, y, TILEWIDTH, TILEHEIGHT)
 
-    def readMazeFile(self, mazefile):
-        return np.loadtxt(mazefile, dtype="<U1")
-
-    def constructBackground(self, background, y):
-        for row in list(range(self.data.shape[0])):
-            for col in list(range(self.data.shape[1])):
-                if self.data[row][col].isdigit():
-                    x = int(self.data[row][col]) + 12
-                    sprite = self.getImage(x, y)
-                    rotval = int(self.rotdata[row][col])
-                    sprite = self.rotate(sprite, rotval)
-                    background.blit(sprite, (col*TILEWIDTH, row*TILEHEIGHT))
-                elif self.data[row][col] == "=":
-                    sprite = self.getImage(10, 8)
-                    background.blit(sprite, (col*TILEWIDTH, row*TILEHEIGHT))
+    def getBackground(self, y):
+        """Return the finished background for palette row y, shared and never to be drawn on.
+
+        Backgrounds are cached in memory and as PNGs on disk, keyed by the
+        maze, rotation and sheet file contents, the palette row and the
+        tile size, so they are only composited the first time a key is seen.
+        """
+        return runSteps(self.buildBackground(y))
+
+    def buildBackground(self, y, tilesPerStep=128):
+        """getBackground() as a generator that yields every tilesPerStep tiles it composites."""
+        key = (fileDigest(self.mazefile), fileDigest(self.rotfile),
+               fileDigest("spritesheet_mspacman.png"), y, TILEWIDTH)
+        if key not in MazeSprites.backgrounds:
+            path = cachePath("backgrounds", keyDigest(*key) + ".png")
+            try:
+                background = pygame.image.load(path).convert()
+            except (FileNotFoundError, pygame.error):
+                background = pygame.surface.Surface(SCREENSIZE).convert()
+                background.fill(BLACK)
+                tiles = MazeFiles.compiled(self.mazefile).tiles.tolist()
+                for start in range(0, len(tiles), tilesPerStep):
+                    self.constructBackground(background, y, tiles[start:start+tilesPerStep])
+                    yield
+                self.saveBackground(background, path)
+                yield
+            MazeSprites.backgrounds[key] = background
+        return MazeSprites.backgrounds[key]
+
+    def saveBackground(self, background, path) -> None:
+        tmppath = path[:-len(".png")] + ".tmp.png"
+        try:
+            pygame.image.save(background, tmppath)
+            os.replace(tmppath, path)
+        except (OSError, pygame.error):
+            pass # A read-only cache only costs the compositing next time
+
+    def constructBackground(self, background, y, tiles=None):
+        if tiles is None:
+            tiles = MazeFiles.compiled(self.mazefile).tiles.tolist()
+        for row, col, tile, rotval in tiles:
+            if tile >= 0:
+                sprite = self.getImage(tile + 12, y)
+                sprite = self.rotate(sprite, rotval)
+            else:
+                sprite = self.getImage(10, 8) # "=" 鬼屋的門
+            background.blit(sprite, (col*TILEWIDTH, row*TILEHEIGHT))
 
         return background
 
@@ -181,15 +325,14 @@ class PacmanGunSprites:
 
     def __init__(self, entity) -> None:
         self.entity = entity
-        self.sheet = pygame.image.load("pacman_gun.png").convert_alpha()
-        self.sheet.set_colorkey((255, 255, 255))        # 若圖片是白底，設為透明
-        # 縮放到與原本角色一致
-        self.sheet = pygame.transform.scale(self.sheet, (2*TILEWIDTH, 2*TILEHEIGHT))
+        # 若圖片是白底，設為透明，並縮放到與原本角色一致
+        self.sheet = SpriteAtlas.getImage("pacman_gun.png", (2*TILEWIDTH, 2*TILEHEIGHT), WHITE)
+        self.translucent = SpriteAtlas.getTranslucent(self.sheet)
         self.entity.image = self.getStartImage()
 
     def update(self, dt) -> None:
-        # 單一靜態圖，不需動畫
-        self.entity.image = self.getStartImage()
+        # 單一靜態圖，不需動畫；隱形時換成半透明版本
+        self.entity.image = self.translucent if self.entity.is_invisible else self.sheet
 
     def reset(self) -> None:
         pass
@@ -203,13 +346,12 @@ class PacmanShieldSprites:
 
     def __init__(self, entity) -> None:
         self.entity = entity
-        self.sheet = pygame.image.load("pacman_shield.png").convert_alpha()
-        self.sheet.set_colorkey((255, 255, 255))  # 若圖片是白底，設為透明
-        self.sheet = pygame.transform.scale(self.sheet, (2*TILEWIDTH, 2*TILEHEIGHT))
+        self.sheet = SpriteAtlas.getImage("pacman_shield.png", (2*TILEWIDTH, 2*TILEHEIGHT), WHITE)  # 若圖片是白底，設為透明
+        self.translucent = SpriteAtlas.getTranslucent(self.sheet)
         self.entity.image = self.getStartImage()
 
     def update(self, dt) -> None:
-        self.entity.image = self.getStartImage()
+        self.entity.image = self.translucent if self.entity.is_invisible else self.sheet
 
     def reset(self) -> None:
         pass
@@ -3,6 +3,67 @@ import pygame
 from constants import *
 from vector import Vector2
 
+FONTPATH = "PressStart2P-Regular.ttf"
+
+
+class FontRegistry:
+    """Shares one pygame Font per (path, size) across the whole process."""
+
+    fonts = {}
+
+    @classmethod
+    def getFont(cls, size, fontpath=FONTPATH):
+        key = (fontpath, size)
+        if key not in cls.fonts:
+            cls.fonts[key] = pygame.font.Font(fontpath, size)
+        return cls.fonts[key]
+
+
+class GlyphAtlas:
+    """Digit glyphs of one (font, size, color), rasterised once and composed into labels.
+
+    Numeric labels (score, level, ghost and fruit points) are built by
+    blitting the cached glyphs side by side instead of running the TTF
+    rasteriser again. Composed labels are memoised as well; they are shared
+    and must not be drawn on.
+    """
+
+    atlases = {}
+    maxLabels = 256
+
+    def __init__(self, fontpath, size, color) -> None:
+        self.font = FontRegistry.getFont(size, fontpath)
+        self.color = color
+        self.glyphs = {digit: self.font.render(digit, 1, color) for digit in "0123456789"}
+        widths = {glyph.get_width() for glyph in self.glyphs.values()}
+        # Composing side by side is only exact for a monospaced font without kerning
+        self.monospaced = len(widths) == 1 and self.font.size("00")[0] == 2 * widths.pop()
+        self.labels = {}
+
+    @classmethod
+    def get(cls, size, color, fontpath=FONTPATH):
+        key = (fontpath, size, tuple(color))
+        if key not in cls.atlases:
+            cls.atlases[key] = GlyphAtlas(fontpath, size, color)
+        return cls.atlases[key]
+
+    def render(self, text):
+        """Return the label for text, composed from glyphs when it is a plain digit string."""
+        if text in self.labels:
+            return self.labels[text]
+        if not (self.monospaced and text.isdigit() and text.isascii()):
+            return self.font.render(text, 1, self.color)
+        glyphs = [self.glyphs[digit] for digit in text]
+        width = glyphs[0].get_width()
+        label = pygame.Surface((width * len(glyphs), glyphs[0].get_height()), pygame.SRCALPHA)
+        for i, glyph in enumerate(glyphs):
+            # Glyphs never overlap, so a max blend copies them exactly onto the transparent label
+            label.blit(glyph, (i * width, 0), special_flags=pygame.BLEND_RGBA_MAX)
+        if len(self.labels) >= self.maxLabels:
+            self.labels.clear()
+        self.labels[text] = label
+        return label
+
 
 class Text:
     def __init__(self, text, color, x, y, size, time=None, id=None, visible=True) -> None:
@@ -16,14 +77,15 @@ class Text:
         self.lifespan = time
         self.label = None
         self.destroy = False
-        self.setupFont("PressStart2P-Regular.ttf")
+        self.setupFont(FONTPATH)
         self.createLabel()
 
     def setupFont(self, fontpath) -> None:
-        self.font = pygame.font.Font(fontpath, self.size)
+        self.glyphs = GlyphAtlas.get(self.size, self.color, fontpath)
+        self.font = self.glyphs.font
 
     def createLabel(self) -> None:
-        self.label = self.font.render(self.text, 1, self.color)
+        self.label = self.glyphs.render(self.text)
 
     def setText(self, newtext) -> None:
         self.text = str(newtext)
@@ -61,14 +123,15 @@ class TextGroup:
     def setupText(self) -> None:
         size = TILEHEIGHT # Default size for SCORE, LEVEL etc.
         small_size = TILEHEIGHT // 2 # Smaller size for HI-SCORE, or a fixed value like 10
+        self.labels = [] # 固定標籤，由 HudLayer 合成繪製
 
         self.alltext[SCORETXT] = Text("0".zfill(8), WHITE, 0, TILEHEIGHT, size)
         self.alltext[LEVELTXT] = Text(str(1).zfill(3), WHITE, 23*TILEWIDTH, TILEHEIGHT, size)
         self.alltext[READYTXT] = Text("READY!", YELLOW, 11.25*TILEWIDTH, 20*TILEHEIGHT, size, visible=False)
         self.alltext[PAUSETXT] = Text("PAUSED!", YELLOW, 10.625*TILEWIDTH, 20*TILEHEIGHT, size, visible=False)
         self.alltext[GAMEOVERTXT] = Text("GAMEOVER!", YELLOW, 10*TILEWIDTH, 20*TILEHEIGHT, size, visible=False)
-        self.addText("SCORE", WHITE, 0, 0, size)
-        self.addText("LEVEL", WHITE, 23*TILEWIDTH, 0, size)
+        self.labels.append(Text("SCORE", WHITE, 0, 0, size))
+        self.labels.append(Text("LEVEL", WHITE, 23*TILEWIDTH, 0, size))
 
         # 移除舊的 HI-SCORE 顯示 (如果之前有)
         if HISCORELABELTXT in self.alltext:
@@ -83,7 +146,7 @@ class TextGroup:
         hiscore_label_x = (SCREENWIDTH // 2) - (8 * small_size // 2) # 估算X使其居中
         hiscore_value_x = (SCREENWIDTH // 2) - (8 * small_size // 2) # 最高分值也大致居中
 
-        self.alltext[HISCORELABELTXT] = Text("HI-SCORE", WHITE, hiscore_label_x, SCREENHEIGHT - (2 * small_size) - 10, small_size, id=HISCORELABELTXT) # HI-SCORE 標籤
+        self.labels.append(Text("HI-SCORE", WHITE, hiscore_label_x, SCREENHEIGHT - (2 * small_size) - 10, small_size, id=HISCORELABELTXT)) # HI-SCORE 標籤
         self.alltext[HISCOREVALUETXT] = Text("0".zfill(8), WHITE, hiscore_value_x, SCREENHEIGHT - small_size - 5, small_size) # HI-SCORE 值 (在標籤下方)
 
     def update(self, dt) -> None: